@@ -0,0 +1,216 @@
+# app/agent_runtime.py
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from app.agents.research_agent import AnthropicAgent
+from app.agents.replay import get_cassette
+from app.progress import ProgressCallbackHandler, ReportStream, STREAM_REPORTS
+from app.metrics import AGENT_SECONDS, LLM_TURNS, LLM_TOKENS, LLM_TOKENS_TOTAL, TOOL_SECONDS
+from config.config_load import CONFIG
+
+RUNTIME_CONFIG = CONFIG.get("agent_runtime", {})
+
+
+class AgentMetricsHandler(BaseCallbackHandler):
+    """Collects model turns, token usage and tool latency for one agent run"""
+
+    def __init__(self):
+        self.turns = 0
+        self.tokens = {"input": 0, "output": 0}
+        self._tools: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.turns += 1
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.tokens["input"] += usage.get("input_tokens", 0)
+                self.tokens["output"] += usage.get("output_tokens", 0)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tools[kwargs.get("run_id")] = (name, time.perf_counter())
+
+    def on_tool_end(self, output, **kwargs):
+        self._finish_tool(kwargs.get("run_id"), "ok")
+
+    def on_tool_error(self, error, **kwargs):
+        self._finish_tool(kwargs.get("run_id"), "error")
+
+    def _finish_tool(self, run_id, outcome: str):
+        name, started = self._tools.pop(run_id, ("tool", None))
+        if started is not None:
+            TOOL_SECONDS.labels(name, outcome).observe(time.perf_counter() - started)
+
+    def observe_run(self):
+        """Record the per-run totals once the run has finished"""
+        LLM_TURNS.observe(self.turns)
+        for kind, count in self.tokens.items():
+            LLM_TOKENS.labels(kind).observe(count)
+            LLM_TOKENS_TOTAL.labels(kind).inc(count)
+
+
+async def invoke_agent(executor, company_id: str, task_id: Optional[str] = None,
+                       callbacks: Optional[list] = None, agent: Optional[AnthropicAgent] = None) -> dict:
+    """
+    Run one report generation on a compiled agent executor
+
+    Args:
+        executor: Graph returned by AnthropicAgent.build_executor()
+        company_id: Company to report on
+        task_id: Task receiving progress events; None runs silently
+        callbacks: Extra LangChain callback handlers, e.g. a TraceRecorder
+        agent: Pipeline mode: the agent whose data tools run up front, in
+               parallel, so the first model call already has the data.
+               None lets the model call every tool itself.
+
+    Returns:
+        Final agent state, as returned by executor.ainvoke
+    """
+    metrics = AgentMetricsHandler()
+    try:
+        return await _invoke(executor, company_id, [metrics, *(callbacks or [])], task_id, agent)
+    finally:
+        metrics.observe_run()
+
+
+async def _invoke(executor, company_id: str, callbacks: list, task_id: Optional[str],
+                  agent: Optional[AnthropicAgent]) -> dict:
+    if task_id:
+        callbacks = [*callbacks, ProgressCallbackHandler(task_id)]
+    config = {"callbacks": callbacks}
+
+    messages = [HumanMessage(content=f"Generate report for company {company_id}")]
+    if agent is not None:
+        messages.extend(await agent.gather_context(company_id, config))
+    inputs = {"messages": messages}
+
+    if not task_id or not STREAM_REPORTS:
+        return await executor.ainvoke(inputs, config=config)
+
+    # Tokens go out as report_delta events while the final state is kept,
+    # so the result matches ainvoke's
+    stream = ReportStream(task_id)
+    result = {}
+    async for mode, chunk in executor.astream(inputs, config=config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            stream.feed(chunk[0])
+        else:
+            result = chunk
+    await stream.drain()
+    return result
+
+
+class AgentRuntime:
+    """
+    Event loop, model client and compiled agent shared by a worker process
+
+    The loop runs in a background thread for the life of the process.
+    Report tasks, typically on Celery's threads pool, submit runs to it and
+    block on the result, so one process holds many I/O-bound runs in flight
+    on a single Anthropic HTTP connection pool. max_concurrent caps the runs
+    executing at once; the rest wait on the loop.
+
+    With pipeline set, each run fetches its data deterministically before
+    the agent loop (see AnthropicAgent.gather_context), saving the model
+    round trips otherwise spent deciding to call the data tools.
+    """
+
+    def __init__(self, max_concurrent: int = 32, pipeline: bool = False):
+        self.max_concurrent = max_concurrent
+        self.pipeline = pipeline
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._agent: Optional[AnthropicAgent] = None
+        self._executor = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._counters = {"in_flight": 0, "waiting": 0, "completed": 0, "failed": 0}
+
+    def run(self, company_id: str, task_id: Optional[str] = None, timeout: Optional[float] = None,
+            callbacks: Optional[list] = None) -> dict:
+        """
+        Generate a report on the shared loop, blocking the calling thread
+
+        Args:
+            company_id: Company to report on
+            task_id: Task receiving progress events
+            timeout: Seconds to wait for the result
+            callbacks: Extra LangChain callback handlers for this run
+
+        Returns:
+            Final agent state
+        """
+        future = asyncio.run_coroutine_threadsafe(self._run(company_id, task_id, callbacks), self._get_loop())
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def _run(self, company_id: str, task_id: Optional[str], callbacks: Optional[list] = None) -> dict:
+        if self._executor is None:
+            # Built on the loop thread so the client's async HTTP pool belongs to this loop
+            self._agent = AnthropicAgent.initialize(
+                CONFIG["anthropic"]["model"], CONFIG["anthropic"]["api_key"], cassette=get_cassette()
+            )
+            self._executor = self._agent.build_executor()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        self._counters["waiting"] += 1
+        async with self._semaphore:
+            self._counters["waiting"] -= 1
+            self._counters["in_flight"] += 1
+            outcome = "failed"
+            started = time.perf_counter()
+            try:
+                result = await invoke_agent(self._executor, company_id, task_id, callbacks,
+                                            self._agent if self.pipeline else None)
+                outcome = "completed"
+                return result
+            finally:
+                AGENT_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+                self._counters["in_flight"] -= 1
+                self._counters[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Run counters; only written on the loop thread"""
+        return {"max_concurrent": self.max_concurrent, "pipeline": self.pipeline, **self._counters}
+
+    def shutdown(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="agent-runtime", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+
+_runtime: Optional[AgentRuntime] = None
+_runtime_pid: Optional[int] = None
+_runtime_lock = threading.Lock()
+
+
+def get_agent_runtime() -> AgentRuntime:
+    """Process-wide agent runtime, created lazily (and again after fork)"""
+    global _runtime, _runtime_pid
+    with _runtime_lock:
+        if _runtime is None or _runtime_pid != os.getpid():
+            _runtime = AgentRuntime(RUNTIME_CONFIG.get("max_concurrent", 32), RUNTIME_CONFIG.get("pipeline", False))
+            _runtime_pid = os.getpid()
+        return _runtime
@@ -0,0 +1,420 @@
+# app/agents/rate_limit.py
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+import anthropic
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from app.agents.tools.compaction import estimate_tokens
+from app.metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_ERRORS
+from config.config_load import CONFIG
+
+RATE_LIMIT_CONFIG = CONFIG.get("rate_limit", {})
+
+# Refill every bucket in proportion to the time since it was last touched,
+# then take from all of them, or from none and return the milliseconds until
+# the emptiest one could serve the request. A shared backoff set after a
+# rate-limit error blocks everyone until it expires.
+# KEYS: backoff key, bucket keys...  ARGV: capacity, amount per bucket
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local blocked = redis.call('PTTL', KEYS[1])
+if blocked > 0 then return blocked end
+local levels, wait = {}, 0
+for i = 2, #KEYS do
+    local capacity = tonumber(ARGV[2 * i - 3])
+    local amount = math.min(tonumber(ARGV[2 * i - 2]), capacity)
+    local state = redis.call('HMGET', KEYS[i], 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    level = math.min(capacity, level + elapsed * capacity / 60000)
+    levels[i] = level - amount
+    if level < amount then wait = math.max(wait, (amount - level) * 60000 / capacity) end
+end
+if wait > 0 then return math.ceil(wait) end
+for i = 2, #KEYS do
+    redis.call('HSET', KEYS[i], 'level', tostring(levels[i]), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], 120000)
+end
+return 0
+"""
+
+# Correct buckets once actual usage is known; levels may go negative (debt)
+# KEYS: bucket keys...  ARGV: capacity, actual minus reserved per bucket
+_SETTLE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local state = redis.call('HMGET', KEYS[i], 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    level = math.min(capacity, level + elapsed * capacity / 60000) - tonumber(ARGV[2 * i])
+    redis.call('HSET', KEYS[i], 'level', tostring(math.min(capacity, level)), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], 120000)
+end
+return 0
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when the shared limiter would make a call wait longer than allowed"""
+
+    def __init__(self, waited: float, retry_after: float):
+        super().__init__(f"Rate limited: waited {waited:.1f}s, next slot in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds to back off after a rate-limit error, None for any other error
+
+    Covers Anthropic 429 (rate limited) and 529 (overloaded) responses,
+    honouring their retry-after header, and RateLimitTimeout.
+    """
+    if isinstance(error, RateLimitTimeout):
+        return error.retry_after
+    if getattr(error, "status_code", None) not in (429, 529):
+        return None
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return RATE_LIMIT_CONFIG.get("default_backoff_seconds", 10)
+
+
+def transient_delay(error: BaseException, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying a transient error, None for any other error
+
+    Connection errors, timeouts, 408/409 and 5xx other than 529 are what the
+    Anthropic SDK retries itself; these retries replace the SDK's, which are
+    off under the limiter so 429s can't bypass the shared backoff. Same
+    exponential schedule as the SDK: 0.5s doubling up to 8s, with jitter.
+    """
+    status = getattr(error, "status_code", None)
+    if not (isinstance(error, anthropic.APIConnectionError)
+            or status in (408, 409)
+            or (isinstance(status, int) and status >= 500 and status != 529)):
+        return None
+    return min(0.5 * 2 ** attempt, 8.0) * random.uniform(0.75, 1.0)
+
+
+class TokenBucketLimiter:
+    """
+    Requests and tokens per minute, shared by every process through Redis
+
+    One bucket per limit, each refilled continuously at its per-minute rate.
+    A call takes its share from all buckets atomically or waits. Token counts
+    are reserved up front from an estimate and settled against the actual
+    usage afterwards. Redis failures let calls through: the API's own limits
+    still apply.
+
+    The async methods use a redis.asyncio client so waiting on Redis never
+    blocks the shared agent event loop; the sync ones serve sync callers.
+    """
+
+    def __init__(self, name: str, limits: Dict[str, float], url: Optional[str] = None):
+        self.name = name
+        self.limits = {kind: float(limit) for kind, limit in limits.items() if limit}
+        self.url = url or CONFIG["redis"]["url"]
+        self._client = None
+        self._acquire_script = None
+        self._settle_script = None
+        self._async_client = None
+        self._async_loop = None
+        self._async_acquire_script = None
+        self._async_settle_script = None
+        self._lock = threading.Lock()
+
+    def _key(self, kind: str) -> str:
+        return f"ratelimit:{self.name}:{kind}"
+
+    def _acquire_call(self, amounts: Dict[str, float]):
+        kinds = [kind for kind in self.limits if amounts.get(kind)]
+        args = []
+        for kind in kinds:
+            args.extend([self.limits[kind], amounts[kind]])
+        return [self._key("backoff")] + [self._key(kind) for kind in kinds], args
+
+    def _settle_call(self, deltas: Dict[str, float]):
+        kinds = [kind for kind in self.limits if deltas.get(kind)]
+        args = []
+        for kind in kinds:
+            args.extend([self.limits[kind], deltas[kind]])
+        return [self._key(kind) for kind in kinds], args
+
+    def _scripts(self):
+        if self._acquire_script is None:
+            with self._lock:
+                if self._acquire_script is None:
+                    import redis
+                    self._client = redis.Redis.from_url(self.url, socket_timeout=2)
+                    self._settle_script = self._client.register_script(_SETTLE_SCRIPT)
+                    self._acquire_script = self._client.register_script(_ACQUIRE_SCRIPT)
+        return self._acquire_script, self._settle_script
+
+    def _async_scripts(self):
+        # redis.asyncio connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            import redis.asyncio
+            self._async_client = redis.asyncio.Redis.from_url(self.url, socket_timeout=2)
+            self._async_settle_script = self._async_client.register_script(_SETTLE_SCRIPT)
+            self._async_acquire_script = self._async_client.register_script(_ACQUIRE_SCRIPT)
+            self._async_loop = loop
+        return self._async_acquire_script, self._async_settle_script
+
+    def try_acquire(self, amounts: Dict[str, float]) -> float:
+        """
+        Take amounts from the buckets if they all have room
+
+        Args:
+            amounts: Kind -> amount, e.g. {"requests": 1, "input_tokens": 1800}
+
+        Returns:
+            0 when granted, otherwise seconds to wait before trying again
+        """
+        keys, args = self._acquire_call(amounts)
+        try:
+            acquire, _ = self._scripts()
+            return acquire(keys=keys, args=args) / 1000
+        except Exception as e:
+            print(f"Rate limiter unavailable, not limiting: {str(e)}")
+            return 0.0
+
+    async def try_acquire_async(self, amounts: Dict[str, float]) -> float:
+        """Async variant of try_acquire"""
+        keys, args = self._acquire_call(amounts)
+        try:
+            acquire, _ = self._async_scripts()
+            return await acquire(keys=keys, args=args) / 1000
+        except Exception as e:
+            print(f"Rate limiter unavailable, not limiting: {str(e)}")
+            return 0.0
+
+    async def acquire(self, amounts: Dict[str, float], max_wait: float):
+        """Wait until amounts are granted; raises RateLimitTimeout past max_wait seconds"""
+        started = time.monotonic()
+        while True:
+            wait = await self.try_acquire_async(amounts)
+            waited = time.monotonic() - started
+            if not wait:
+                RATE_LIMIT_WAIT_SECONDS.observe(waited)
+                return
+            if waited + wait > max_wait:
+                RATE_LIMIT_WAIT_SECONDS.observe(waited)
+                raise RateLimitTimeout(waited, wait)
+            # Jitter keeps waiting workers from retrying in lockstep
+            await asyncio.sleep(wait + random.uniform(0, 0.1))
+
+    def acquire_sync(self, amounts: Dict[str, float], max_wait: float):
+        """Blocking variant of acquire"""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(amounts)
+            waited = time.monotonic() - started
+            if not wait:
+                RATE_LIMIT_WAIT_SECONDS.observe(waited)
+                return
+            if waited + wait > max_wait:
+                RATE_LIMIT_WAIT_SECONDS.observe(waited)
+                raise RateLimitTimeout(waited, wait)
+            time.sleep(wait + random.uniform(0, 0.1))
+
+    def settle(self, deltas: Dict[str, float]):
+        """Return over-reserved amounts (negative deltas) or take the shortfall"""
+        keys, args = self._settle_call(deltas)
+        if not keys:
+            return
+        try:
+            _, settle = self._scripts()
+            settle(keys=keys, args=args)
+        except Exception as e:
+            print(f"Failed to settle rate limiter: {str(e)}")
+
+    async def settle_async(self, deltas: Dict[str, float]):
+        """Async variant of settle"""
+        keys, args = self._settle_call(deltas)
+        if not keys:
+            return
+        try:
+            _, settle = self._async_scripts()
+            await settle(keys=keys, args=args)
+        except Exception as e:
+            print(f"Failed to settle rate limiter: {str(e)}")
+
+    def back_off(self, seconds: float):
+        """Hold every process's calls for seconds, e.g. after a 429"""
+        try:
+            self._scripts()
+            backoff = self._key("backoff")
+            remaining = self._client.pttl(backoff)
+            if remaining is None or remaining < seconds * 1000:
+                self._client.set(backoff, 1, px=max(1, int(seconds * 1000)))
+        except Exception as e:
+            print(f"Failed to set rate limit backoff: {str(e)}")
+
+    async def back_off_async(self, seconds: float):
+        """Async variant of back_off"""
+        try:
+            self._async_scripts()
+            backoff = self._key("backoff")
+            remaining = await self._async_client.pttl(backoff)
+            if remaining is None or remaining < seconds * 1000:
+                await self._async_client.set(backoff, 1, px=max(1, int(seconds * 1000)))
+        except Exception as e:
+            print(f"Failed to set rate limit backoff: {str(e)}")
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    Chat model whose calls to another model pass through a shared limiter
+
+    Each call reserves one request, its estimated input tokens and
+    output_tokens_estimate output tokens, then settles them from the usage
+    reported by the response. A 429/529 response sets a shared backoff of
+    its retry-after and is retried up to max_retries times, so all workers
+    slow down together instead of each hammering the API. Transient errors
+    (connections, timeouts, 5xx) are retried as often, after a local delay.
+    """
+
+    inner: BaseChatModel
+    limiter: Any
+    output_tokens_estimate: int = 1024
+    max_retries: int = 3
+    max_wait: float = 120.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "rate-limited"
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, then bind the same kwargs here
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def _reserve(self, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> Dict[str, float]:
+        text = "".join(str(m.content) for m in messages) + json.dumps(kwargs.get("tools", []), default=str)
+        return {"requests": 1, "input_tokens": estimate_tokens(text), "output_tokens": self.output_tokens_estimate}
+
+    @staticmethod
+    def _deltas(reserved: Dict[str, float], usage: Optional[Dict[str, Any]]) -> Dict[str, float]:
+        if not usage:
+            return {}
+        return {
+            "input_tokens": usage.get("input_tokens", 0) - reserved["input_tokens"],
+            "output_tokens": usage.get("output_tokens", 0) - reserved["output_tokens"],
+        }
+
+    def _backoff_for(self, error: BaseException) -> Optional[float]:
+        """Shared backoff to set after error, None when it isn't a retryable rate-limit error"""
+        backoff = retry_after(error)
+        if backoff is None or isinstance(error, RateLimitTimeout):
+            return None
+        RATE_LIMIT_ERRORS.labels(str(getattr(error, "status_code", ""))).inc()
+        return backoff
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        backoff = self._backoff_for(error)
+        if backoff is not None:
+            self.limiter.back_off(backoff)
+            return attempt < self.max_retries
+        delay = transient_delay(error, attempt)
+        if delay is None or attempt >= self.max_retries:
+            return False
+        time.sleep(delay)
+        return True
+
+    async def _should_retry_async(self, error: BaseException, attempt: int) -> bool:
+        backoff = self._backoff_for(error)
+        if backoff is not None:
+            await self.limiter.back_off_async(backoff)
+            return attempt < self.max_retries
+        delay = transient_delay(error, attempt)
+        if delay is None or attempt >= self.max_retries:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reserved = self._reserve(messages, kwargs)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire_sync(reserved, self.max_wait)
+            try:
+                result = self.inner._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if self._should_retry(e, attempt):
+                    continue
+                raise
+            self.limiter.settle(self._deltas(reserved, getattr(result.generations[0].message, "usage_metadata", None)))
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reserved = self._reserve(messages, kwargs)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(reserved, self.max_wait)
+            try:
+                result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if await self._should_retry_async(e, attempt):
+                    continue
+                raise
+            await self.limiter.settle_async(self._deltas(reserved, getattr(result.generations[0].message, "usage_metadata", None)))
+            return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        reserved = self._reserve(messages, kwargs)
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(reserved, self.max_wait)
+            usage: Dict[str, int] = {}
+            started = False
+            try:
+                async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+                    started = True
+                    chunk_usage = getattr(chunk.message, "usage_metadata", None) or {}
+                    for kind in ("input_tokens", "output_tokens"):
+                        if kind in chunk_usage:
+                            usage[kind] = usage.get(kind, 0) + chunk_usage[kind]
+                    yield chunk
+            except Exception as e:
+                # Once text has gone out the call can't be repeated transparently
+                if not started and await self._should_retry_async(e, attempt):
+                    continue
+                raise
+            await self.limiter.settle_async(self._deltas(reserved, usage))
+            return
+
+
+_limiter: Optional[TokenBucketLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[TokenBucketLimiter]:
+    """Process-wide Anthropic limiter from the [rate_limit] config section; None when disabled"""
+    global _limiter
+    if not RATE_LIMIT_CONFIG.get("enabled", False):
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucketLimiter("anthropic", {
+                "requests": RATE_LIMIT_CONFIG.get("requests_per_minute", 0),
+                "input_tokens": RATE_LIMIT_CONFIG.get("input_tokens_per_minute", 0),
+                "output_tokens": RATE_LIMIT_CONFIG.get("output_tokens_per_minute", 0),
+            }, RATE_LIMIT_CONFIG.get("url"))
+        return _limiter
+
+
+def wrap_for_rate_limit(model: BaseChatModel, limiter: TokenBucketLimiter) -> RateLimitedChatModel:
+    """Route a model's calls through limiter with the [rate_limit] settings"""
+    return RateLimitedChatModel(
+        inner=model,
+        limiter=limiter,
+        output_tokens_estimate=RATE_LIMIT_CONFIG.get("output_tokens_estimate", 1024),
+        max_retries=RATE_LIMIT_CONFIG.get("max_retries", 3),
+        max_wait=RATE_LIMIT_CONFIG.get("max_wait_seconds", 120),
+    )
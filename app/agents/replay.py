@@ -0,0 +1,396 @@
+# app/agents/replay.py
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessageChunk, BaseMessage, message_chunk_to_message, message_to_dict, messages_from_dict
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.outputs.chat_generation import merge_chat_generation_chunks
+from langchain_core.tools import BaseTool
+from config.config_load import CONFIG
+
+REPLAY_CONFIG = CONFIG.get("replay", {})
+
+# Message fields that change between otherwise identical runs
+_VOLATILE_FIELDS = ("id", "response_metadata", "usage_metadata", "additional_kwargs")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a call that was never recorded"""
+
+
+def _normalize(value: Any) -> Any:
+    """JSON round trip, so recorded and replayed values compare and look identical"""
+    return json.loads(json.dumps(value, sort_keys=True, default=str))
+
+
+def _message_key(message: BaseMessage) -> Dict[str, Any]:
+    data = message_to_dict(message)
+    fields = {k: v for k, v in data["data"].items() if k not in _VOLATILE_FIELDS and v not in (None, [], {})}
+    return {"type": data["type"], **fields}
+
+
+def request_key(kind: str, name: str, payload: Any) -> str:
+    """
+    Normalized hash of one LLM or tool request
+
+    Args:
+        kind: "llm" or "tool"
+        name: Model or tool name
+        payload: Messages and bound kwargs, or tool arguments
+
+    Returns:
+        Hex digest identifying the request
+    """
+    raw = json.dumps([kind, name, _normalize(payload)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def read_entries(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Responses recorded in a cassette file, by request key
+
+    Reads gzipped JSON lines, {"key": ..., "response": ...}. A record cut
+    short by a crash mid-write ends the file instead of failing the load.
+    """
+    entries: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    entries.setdefault(record["key"], []).append(record["response"])
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        print(f"Cassette {path} ends with an incomplete record, ignoring it: {str(e)}")
+    return entries
+
+
+class Cassette:
+    """
+    Recorded request/response pairs for the agent's model and tool calls
+
+    Stored as gzipped JSON lines, one {"key": ..., "response": ...} record
+    per call. Each response keeps the call's duration. Repeated identical
+    requests are replayed in recorded order, and the last response is reused
+    once a key is exhausted.
+
+    Recording appends each record to the file as its own gzip member from a
+    background thread, so a call costs one small write that never runs on
+    the agent's event loop. Workers recording into the same file add to it
+    rather than overwrite each other.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency_scale: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Future] = None
+        self._counters = {"llm_calls": 0, "tool_calls": 0, "input_tokens": 0, "output_tokens": 0, "misses": 0}
+        if os.path.exists(path):
+            self._entries = read_entries(path)
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {path}")
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def lookup(self, key: str) -> Dict[str, Any]:
+        """Next recorded response for key; raises CassetteMiss if there is none"""
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                self._counters["misses"] += 1
+                raise CassetteMiss(f"No recorded response for request {key[:12]}")
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            return responses[min(index, len(responses) - 1)]
+
+    def record(self, key: str, response: Dict[str, Any]):
+        """Add a response and queue its append to the cassette file"""
+        line = json.dumps({"key": key, "response": response}, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._entries.setdefault(key, []).append(response)
+            if self._writer is None:
+                # One thread, so records reach the file in the order they were made
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cassette")
+            self._pending = self._writer.submit(self._append, line)
+
+    def _append(self, line: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            data = gzip.compress(line.encode("utf-8"))
+            # A single write per member keeps concurrent appenders from interleaving
+            with open(self.path, "ab") as f:
+                f.write(data)
+        except Exception as e:
+            print(f"Failed to write cassette record: {str(e)}")
+
+    def flush(self):
+        """Block until every queued record is in the file"""
+        with self._lock:
+            pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def delay(self, response: Dict[str, Any]) -> float:
+        """Simulated latency for a replayed response"""
+        return response.get("elapsed", 0.0) * self.latency_scale
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls and token volume seen through this cassette since it was opened"""
+        with self._lock:
+            return {"mode": self.mode, "entries": sum(len(v) for v in self._entries.values()), **self._counters}
+
+
+def stream_chunks(message: BaseMessage) -> List[AIMessageChunk]:
+    """
+    Split a recorded message into the chunks a streaming model would send
+
+    Text is cut at word boundaries; tool calls and token usage ride on the
+    last chunk, as they do in a live stream.
+    """
+    content = message.content
+    pieces = re.findall(r"\S+\s*|\s+", content) if isinstance(content, str) and content else [content]
+    chunks = [AIMessageChunk(content=piece) for piece in pieces]
+    chunks[-1] = AIMessageChunk(
+        content=chunks[-1].content,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(getattr(message, "tool_calls", None) or [])
+        ],
+        usage_metadata=getattr(message, "usage_metadata", None),
+        response_metadata=getattr(message, "response_metadata", None) or {},
+    )
+    return chunks
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Chat model that records or replays another model's responses
+
+    Streamed calls are recorded as the merged message plus the time to the
+    first chunk, and replayed word by word over the recorded duration, so
+    report_delta events and time to first content can be profiled offline.
+    """
+
+    inner: BaseChatModel
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, then bind the same kwargs here
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def _request_key(self, messages: List[BaseMessage], stop, kwargs) -> str:
+        name = getattr(self.inner, "model", None) or self.inner._llm_type
+        payload = {"messages": [_message_key(m) for m in messages], "stop": stop, "kwargs": kwargs}
+        return request_key("llm", name, payload)
+
+    def _message(self, response: Dict[str, Any]) -> BaseMessage:
+        """Recorded message, counted in the cassette's stats"""
+        message = messages_from_dict([response["message"]])[0]
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.cassette.count("llm_calls")
+        self.cassette.count("input_tokens", usage.get("input_tokens", 0))
+        self.cassette.count("output_tokens", usage.get("output_tokens", 0))
+        return message
+
+    def _result(self, response: Dict[str, Any]) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._message(response))],
+                          llm_output=response.get("llm_output"))
+
+    def _response(self, result: ChatResult, elapsed: float) -> Dict[str, Any]:
+        return {
+            "message": message_to_dict(result.generations[0].message),
+            "llm_output": _normalize(result.llm_output) if result.llm_output else None,
+            "elapsed": round(elapsed, 3),
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._request_key(messages, stop, kwargs)
+        if self.cassette.recording:
+            started = time.monotonic()
+            result = self.inner._generate(messages, stop=stop, **kwargs)
+            response = self._response(result, time.monotonic() - started)
+            self.cassette.record(key, response)
+        else:
+            response = self.cassette.lookup(key)
+            time.sleep(self.cassette.delay(response))
+        return self._result(response)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._request_key(messages, stop, kwargs)
+        if self.cassette.recording:
+            started = time.monotonic()
+            result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+            response = self._response(result, time.monotonic() - started)
+            self.cassette.record(key, response)
+        else:
+            response = self.cassette.lookup(key)
+            await asyncio.sleep(self.cassette.delay(response))
+        return self._result(response)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        key = self._request_key(messages, stop, kwargs)
+        if self.cassette.recording:
+            if type(self.inner)._astream is BaseChatModel._astream:
+                # The wrapped model can't stream: record the whole response, then replay it below
+                result = await self._agenerate(messages, stop=stop, **kwargs)
+                for chunk in stream_chunks(result.generations[0].message):
+                    yield ChatGenerationChunk(message=chunk)
+                return
+            started = time.monotonic()
+            first_chunk = None
+            chunks = []
+            async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - started
+                chunks.append(chunk)
+                yield chunk
+            merged = merge_chat_generation_chunks(chunks)
+            message = message_chunk_to_message(merged.message) if merged else AIMessageChunk(content="")
+            result = ChatResult(generations=[ChatGeneration(message=message)])
+            response = self._response(result, time.monotonic() - started)
+            response["first_chunk"] = round(first_chunk or 0.0, 3)
+            self.cassette.record(key, response)
+            self._message(response)  # counted like the other calls
+            return
+
+        response = self.cassette.lookup(key)
+        chunks = stream_chunks(self._message(response))
+        # Calls recorded without streaming have no first-chunk time: spread it all evenly
+        total = self.cassette.delay(response)
+        first = min(total, response.get("first_chunk", 0.0) * self.cassette.latency_scale)
+        started = time.monotonic()
+        for i, chunk in enumerate(chunks, 1):
+            # Sleep to a schedule rather than per chunk, so timer overhead doesn't add up
+            await asyncio.sleep(max(0.0, started + first + (total - first) * i / len(chunks) - time.monotonic()))
+            yield ChatGenerationChunk(message=chunk)
+
+
+class ReplayTool(BaseTool):
+    """Tool that records or replays another tool's outputs"""
+
+    inner: BaseTool
+    cassette: Any
+
+    def _request_key(self, kwargs: Dict[str, Any]) -> str:
+        return request_key("tool", self.name, kwargs)
+
+    def _run(self, run_manager: Optional[CallbackManagerForToolRun] = None, **kwargs) -> Any:
+        key = self._request_key(kwargs)
+        self.cassette.count("tool_calls")
+        if self.cassette.recording:
+            started = time.monotonic()
+            # Recorded and returned after the same JSON round trip, so the
+            # model sees identical tool output in both modes
+            output = _normalize(self.inner.invoke(kwargs))
+            self.cassette.record(key, {"output": output, "elapsed": round(time.monotonic() - started, 3)})
+            return output
+        response = self.cassette.lookup(key)
+        time.sleep(self.cassette.delay(response))
+        return response["output"]
+
+    async def _arun(self, run_manager=None, **kwargs) -> Any:
+        key = self._request_key(kwargs)
+        self.cassette.count("tool_calls")
+        if self.cassette.recording:
+            started = time.monotonic()
+            output = _normalize(await self.inner.ainvoke(kwargs))
+            self.cassette.record(key, {"output": output, "elapsed": round(time.monotonic() - started, 3)})
+            return output
+        response = self.cassette.lookup(key)
+        await asyncio.sleep(self.cassette.delay(response))
+        return response["output"]
+
+
+def wrap_for_replay(model: BaseChatModel, tools: List[BaseTool], cassette: Cassette) -> Tuple[BaseChatModel, List[BaseTool]]:
+    """
+    Route the agent's model and tool calls through a cassette
+
+    Args:
+        model: Chat model built for the agent
+        tools: Tools built for the agent
+        cassette: Cassette to record into or replay from
+
+    Returns:
+        (model, tools) wrappers with the same names and schemas
+    """
+    wrapped_tools = [
+        ReplayTool(
+            inner=tool, cassette=cassette, name=tool.name,
+            description=tool.description, args_schema=tool.args_schema
+        )
+        for tool in tools
+    ]
+    return ReplayChatModel(inner=model, cassette=cassette), wrapped_tools
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Process-wide cassette from the [replay] config section; None when mode is off"""
+    global _cassette
+    mode = REPLAY_CONFIG.get("mode", "off")
+    if mode == "off":
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(
+                REPLAY_CONFIG.get("cassette", "./cache/cassettes/agent.jsonl.gz"),
+                mode=mode,
+                latency_scale=REPLAY_CONFIG.get("latency_scale", 0.0)
+            )
+        return _cassette
+
+
+def summarize(path: str) -> Dict[str, Any]:
+    """Turn count and token volume recorded in a cassette"""
+    entries = read_entries(path)
+    summary = {"llm_calls": 0, "tool_calls": 0, "input_tokens": 0, "output_tokens": 0, "recorded_seconds": 0.0}
+    for responses in entries.values():
+        for response in responses:
+            summary["recorded_seconds"] += response.get("elapsed", 0.0)
+            if "message" in response:
+                usage = response["message"]["data"].get("usage_metadata") or {}
+                summary["llm_calls"] += 1
+                summary["input_tokens"] += usage.get("input_tokens", 0)
+                summary["output_tokens"] += usage.get("output_tokens", 0)
+            else:
+                summary["tool_calls"] += 1
+    summary["recorded_seconds"] = round(summary["recorded_seconds"], 3)
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "summary":
+        print("Usage: python -m app.agents.replay summary <cassette>")
+        sys.exit(1)
+    print(json.dumps(summarize(sys.argv[2]), indent=2))
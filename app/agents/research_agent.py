@@ -1,8 +1,17 @@
 from langchain_anthropic import ChatAnthropic
 from app.agents.tools.company_data_tool import CompanyDataTool
+from app.agents.tools.financial_ratios_tool import FinancialRatiosTool
 from app.agents.tools.yahoo_finance_tool import YahooFinanceTool
 from langchain.agents import AgentExecutor
 from langgraph.prebuilt import create_react_agent
+from langchain_core.messages import AIMessage, ToolMessage
+from app.agents.tools.compaction import COMPACTION_ENABLED
+from app.prefetch import resolve_tickers
+from config.config_load import CONFIG
+from typing import Optional
+import asyncio
+import hashlib
+import json
 
 class AnthropicAgent:
 
@@ -10,11 +19,12 @@ class AnthropicAgent:
             self.tools = tools
             self.model = model
 
-        def _base_prompt(self) -> str:
+        @staticmethod
+        def _base_prompt() -> str:
             return """You are a professional equity research analyst tasked with generating comprehensive research reports.
             Follow these steps to generate a high-quality equity research report:
             1. Analyze company fundamentals.
-            2. Analyze the financial data using the financial_analysis tool
+            2. Analyze the financial data using the financial_ratios tool, which returns precomputed ratios and growth rates
             3. Synthesize all information into a comprehensive research report
             Your report should include:
             - Executive Summary
@@ -39,16 +49,93 @@ class AnthropicAgent:
 
             return agent_executor
         
+        async def gather_context(self, company_id: str, config: Optional[dict] = None) -> list:
+            """
+            Run the data tools every report needs in parallel, without the model
+
+            Company data, financial ratios and one year of market data are
+            fetched at once through the agent's own tools (so replay, payload
+            compaction and callbacks apply). The results come back as the
+            tool-call turn the model would otherwise spend one round trip per
+            step producing, ready to follow the user's request.
+
+            Args:
+                company_id: Company to report on
+                config: Runnable config for the tool calls, e.g. callbacks
+
+            Returns:
+                An AIMessage with the tool calls followed by one ToolMessage per call
+            """
+            tools = {tool.name: tool for tool in self.tools}
+            calls = [
+                {"name": "company_data_loader", "args": {"company_id": company_id}},
+                {"name": "financial_ratios", "args": {"company_id": company_id}},
+            ]
+            ticker = resolve_tickers([company_id]).get(company_id)
+            if ticker:
+                calls.append({"name": "yahoo_finance", "args": {"ticker": ticker, "period": "1y"}})
+            calls = [{**call, "id": f"pipeline_{call['name']}"} for call in calls if call["name"] in tools]
+
+            results = await asyncio.gather(
+                *(tools[call["name"]].ainvoke(call["args"], config) for call in calls), return_exceptions=True
+            )
+            messages = [AIMessage(content="", tool_calls=calls)]
+            for call, result in zip(calls, results):
+                if isinstance(result, BaseException):
+                    content, status = f"Error: {result}", "error"
+                else:
+                    content = result if isinstance(result, str) else json.dumps(result, default=str)
+                    status = "success"
+                messages.append(ToolMessage(content=content, tool_call_id=call["id"], name=call["name"], status=status))
+            return messages
+
         @classmethod
-        def initialize(cls, model:str,api_key:str):
+        def initialize(cls, model:str,api_key:str, cassette=None):
+            """
+            Build the agent's model and tools
+
+            Args:
+                model: Anthropic model name
+                api_key: Anthropic API key
+                cassette: Optional replay Cassette recording or replaying
+                          every model and tool call
+            """
+            from app.agents.rate_limit import get_rate_limiter, wrap_for_rate_limit
+            limiter = get_rate_limiter()
 
             llm = ChatAnthropic(
                 model = model,
                 temperature=0.2,
                 verbose= True,
-                api_key = api_key 
+                api_key = api_key,
+                # The limiter wrapper retries instead: 429/529 behind the shared
+                # backoff, connection errors, timeouts and 5xx like the SDK would
+                max_retries = 0 if limiter is not None else 2
             )
+            if limiter is not None:
+                llm = wrap_for_rate_limit(llm, limiter)
             tools = [CompanyDataTool(),
+                    FinancialRatiosTool(),
                     YahooFinanceTool()]
 
-            return cls(tools=tools, model=llm)
\ No newline at end of file
+            if cassette is not None:
+                from app.agents.replay import wrap_for_replay
+                llm, tools = wrap_for_replay(llm, tools, cassette)
+
+            return cls(tools=tools, model=llm)
+
+def prompt_version() -> str:
+    """Short hash of the system prompt, so prompt edits invalidate cached reports"""
+    return hashlib.sha256(AnthropicAgent._base_prompt().encode("utf-8")).hexdigest()[:12]
+
+
+def agent_mode() -> str:
+    """
+    How runs feed the model: "pipeline" or "tools", plus "+compact" when
+    tool payloads are compacted
+
+    Both change what the model sees, so the mode is part of the report
+    cache key and stored with each run's trace.
+    """
+    mode = "pipeline" if CONFIG.get("agent_runtime", {}).get("pipeline", False) else "tools"
+    return f"{mode}+compact" if COMPACTION_ENABLED else mode
\ No newline at end of file
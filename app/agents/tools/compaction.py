@@ -0,0 +1,126 @@
+# app/agents/tools/compaction.py
+import json
+import math
+from typing import Any, Dict, List, Optional
+from config.config_load import CONFIG
+
+COMPACTION_CONFIG = CONFIG.get("tool_payloads", {})
+COMPACTION_ENABLED = COMPACTION_CONFIG.get("enabled", True)
+# Significant digits kept for floats; lowered step by step to fit a budget
+SIGNIFICANT_DIGITS = COMPACTION_CONFIG.get("significant_digits", 5)
+MIN_SIGNIFICANT_DIGITS = 3
+# Rough characters per token for JSON-heavy text
+CHARS_PER_TOKEN = 4
+
+
+def round_value(value: Any, digits: int) -> Any:
+    """
+    Round floats to significant digits, recursively
+
+    Integer digits are never dropped: values of 10**digits or more are
+    rounded to whole numbers, so 763876.0 is sent as 763876 and
+    14032.444030761719 as 14032. NaN and infinities become None.
+    """
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        rounded = float(round(value)) if abs(value) >= 10 ** digits else float(f"{value:.{digits}g}")
+        return int(rounded) if rounded.is_integer() and abs(rounded) < 1e15 else rounded
+    if isinstance(value, dict):
+        return {k: round_value(v, digits) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [round_value(v, digits) for v in value]
+    return value
+
+
+def tabulate(value: Any) -> Any:
+    """
+    Turn lists of same-keyed records into {"columns": [...], "rows": [[...]]}
+
+    Field names are then sent once per table instead of once per row.
+    """
+    if isinstance(value, dict):
+        return {k: tabulate(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if len(value) > 1 and all(isinstance(item, dict) for item in value):
+            columns = list(value[0])
+            if all(list(item) == columns for item in value):
+                return {"columns": columns, "rows": [[tabulate(item[c]) for c in columns] for item in value]}
+        return [tabulate(item) for item in value]
+    return value
+
+
+def encode(value: Any) -> str:
+    """JSON without whitespace"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _tables(value: Any) -> List[Dict[str, Any]]:
+    """Every tabulated table in a payload, largest first"""
+    found = []
+    if isinstance(value, dict):
+        if set(value) == {"columns", "rows"}:
+            found.append(value)
+        else:
+            for item in value.values():
+                found.extend(_tables(item))
+    elif isinstance(value, list):
+        for item in value:
+            found.extend(_tables(item))
+    return sorted(found, key=lambda table: len(table["rows"]), reverse=True)
+
+
+def max_tokens(tool_name: str) -> Optional[int]:
+    """Configured token budget for a tool's output, None for no limit"""
+    return COMPACTION_CONFIG.get("max_tokens", {}).get(tool_name)
+
+
+def compact_payload(tool_name: str, payload: Any) -> Any:
+    """
+    Shrink a tool's output before it reaches the model
+
+    Floats are rounded, record lists become column tables and the result is
+    encoded as whitespace-free JSON. If it is still over the tool's token
+    budget, precision is lowered down to MIN_SIGNIFICANT_DIGITS, then the
+    oldest rows of the largest tables are dropped (rows are chronological),
+    and finally the text is cut.
+
+    Args:
+        tool_name: Tool producing the payload, selects [tool_payloads.max_tokens]
+        payload: JSON-compatible tool output
+
+    Returns:
+        Compact JSON text, or the payload unchanged when compaction is disabled
+        or the payload is already a string (e.g. an error message)
+    """
+    if not COMPACTION_ENABLED or isinstance(payload, str):
+        return payload
+
+    budget = max_tokens(tool_name)
+    table = tabulate(payload)
+    for digits in range(SIGNIFICANT_DIGITS, MIN_SIGNIFICANT_DIGITS - 1, -1):
+        compacted = round_value(table, digits)
+        text = encode(compacted)
+        if budget is None or estimate_tokens(text) <= budget:
+            return text
+
+    omitted = 0
+    while estimate_tokens(text) > budget:
+        tables = [t for t in _tables(compacted) if len(t["rows"]) > 1]
+        if not tables:
+            break
+        tables[0]["rows"].pop(0)
+        omitted += 1
+        # Tell the model the table is incomplete rather than let it assume full history
+        text = encode({**compacted, "omitted_oldest_rows": omitted} if isinstance(compacted, dict) else compacted)
+
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) > limit:
+        text = text[:limit] + "...[truncated]"
+    return text
@@ -6,7 +6,8 @@ from langchain_core.callbacks import (
 from langchain_core.tools import BaseTool
 from langchain_core.tools.base import ArgsSchema
 from pydantic import BaseModel, Field
-from app.data_loader import DataLoader as DLoader
+from app.data_loader import data_loader
+from app.agents.tools.compaction import compact_payload
 
 class CompanyDataInput(BaseModel):
     company_id: str = Field(description="Company ID to fetch data for")
@@ -23,8 +24,7 @@ class CompanyDataTool(BaseTool):
         self, company_id: str, run_manager: Optional[CallbackManagerForToolRun] = None
     ) -> Dict[str, Any]:
         """Use the tool."""
-        dloader= DLoader()
-        return dloader.get_company_data(company_id)
+        return compact_payload(self.name, data_loader.get_company_data(company_id))
 
     # async def _arun(
     #     self,
@@ -0,0 +1,32 @@
+# app/agents/tools/financial_ratios_tool.py
+from typing import Optional, Dict, Any
+from langchain_core.callbacks import (
+    CallbackManagerForToolRun,
+)
+from langchain_core.tools import BaseTool
+from langchain_core.tools.base import ArgsSchema
+from pydantic import BaseModel, Field
+from app.data_loader import data_loader
+from app.agents.tools.compaction import compact_payload
+
+class FinancialRatiosInput(BaseModel):
+    company_id: str = Field(description="Company ID to compute financial ratios for")
+    years: int = Field(5, ge=1, le=30, description="Number of most recent fiscal years to return (1-30)")
+
+# Note: It's important that every field has type hints. BaseTool is a
+# Pydantic class and not having type hints can lead to unexpected behavior.
+class FinancialRatiosTool(BaseTool):
+    name: str = "financial_ratios"
+    description: str = (
+        "tool for getting precomputed financial ratios by fiscal year according to company_id: "
+        "ROE, ROA, debt/equity, current ratio, net margin, YoY growth and 3/5-year CAGR. "
+        "Use these numbers instead of calculating ratios yourself"
+    )
+    args_schema: Optional[ArgsSchema] = FinancialRatiosInput
+    return_direct: bool = False
+
+    def _run(
+        self, company_id: str, years: int = 5, run_manager: Optional[CallbackManagerForToolRun] = None
+    ) -> Dict[str, Any]:
+        """Use the tool."""
+        return compact_payload(self.name, data_loader.get_company_ratios(company_id, years))
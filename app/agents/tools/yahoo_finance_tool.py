@@ -1,5 +1,6 @@
 # app/agents/tools/yahoo_finance_tool.py
 import yfinance as yf
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
@@ -10,6 +11,23 @@ from langchain_core.tools import BaseTool
 from langchain_core.tools.base import ArgsSchema
 from pydantic import BaseModel, Field
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from app.market_cache import get_market_cache
+from app.agents.tools.compaction import COMPACTION_ENABLED, compact_payload
+from config.config_load import CONFIG
+
+YAHOO_CONFIG = CONFIG.get("yahoo_finance", {})
+# Seconds each Yahoo Finance call may take before its section is dropped
+FETCH_TIMEOUT = YAHOO_CONFIG.get("timeout", 15)
+
+# Trailing windows, in trading days, for the history summary sent to the model
+RETURN_HORIZONS = {"1w": 5, "1m": 21, "3m": 63, "6m": 126, "1y": 252}
+MOVING_AVERAGES = (20, 50, 200)
+
+# yfinance is blocking, so calls run here; shared by every tool instance in the process
+_fetch_executor = ThreadPoolExecutor(max_workers=YAHOO_CONFIG.get("max_workers", 16), thread_name_prefix="yfinance")
 
 class YahooFinanceInput(BaseModel):
     ticker: str = Field(..., description="Stock ticker symbol")
@@ -24,10 +42,10 @@ class YahooFinanceTool(BaseTool):
 
     def _run(self, ticker: str, period: str = "1m") -> Dict[str, Any]:
         try:
-            result = asyncio.run(self.fetch_stock_data(ticker, period))
+            result = self.fetch_stock_data_sync(ticker, period)
             if "error" in result:
                 return f"Error occurred while fetching stock data: {result['error']}"
-            return result
+            return self._for_model(result)
         except AttributeError as e:
             if "'NoneType' object has no attribute 'update'" in str(e):
                 return "Can not get that stock's data, please check the stock code and try again later."
@@ -42,7 +60,7 @@ class YahooFinanceTool(BaseTool):
             result = await self.fetch_stock_data(ticker, period)
             if "error" in result:
                 return f"Error occurred while fetching stock data: {result['error']}"
-            return result
+            return self._for_model(result)
         except AttributeError as e:
             if "'NoneType' object has no attribute 'update'" in str(e):
                 return "Can not get that stock's data, please check the stock code and try again later."
@@ -52,10 +70,23 @@ class YahooFinanceTool(BaseTool):
             return f"Unknown error occurred: {e}"
 
 
+    def _for_model(self, result: Dict[str, Any]) -> Any:
+        """Replace the raw price rows with summary statistics and compact the payload"""
+        if not COMPACTION_ENABLED:
+            return result
+        if result.get("historical_data") is not None:
+            result = {**result, "historical_data": self.summarize_history(result["historical_data"])}
+        return compact_payload(self.name, result)
+
     async def fetch_stock_data(self, ticker: str, period: str = "1m") -> Dict[str, Any]:
         """
         Fetch essential stock data from Yahoo Finance.
 
+        The info, history and statement requests are independent, so they run
+        in parallel on a thread pool, each through the shared market data
+        cache and each with its own timeout. A section that fails or times
+        out is returned as None and listed under "errors".
+
         Args:
             ticker: Stock ticker symbol
             period: Time period for historical data (e.g., "1mo", "6mo", "1y", "5y")
@@ -63,75 +94,186 @@ class YahooFinanceTool(BaseTool):
         Returns:
             Dictionary containing key stock data.
         """
-        try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            simplified_info = {
-                'symbol': info.get('symbol'),
-                'shortName': info.get('shortName'),
-                'industry': info.get('industry'),
-                'sector': info.get('sector'),
-                'currentPrice': info.get('currentPrice'),
-                'previousClose': info.get('previousClose'),
-                'marketCap': info.get('marketCap'),
-                'trailingPE': info.get('trailingPE'),
-                'forwardPE': info.get('forwardPE'),
-                'recommendationMean': info.get('recommendationMean')
-            }
-
-            # Fetch historical data
-            end_date = datetime.now()
-            if period.endswith('y'):
-                start_date = end_date - timedelta(days=365 * int(period[:-1]))
-                max_history_points = 90
-            elif period.endswith('m'):
-                start_date = end_date - timedelta(days=30 * int(period[:-1]))
-                max_history_points = 60
-            else:
-                start_date = end_date - timedelta(days=30)  # Default to 1 months
-                max_history_points = 30
+        loop = asyncio.get_running_loop()
+        jobs = self._fetch_jobs(ticker, period)
+        futures = [
+            asyncio.wait_for(loop.run_in_executor(_fetch_executor, call), FETCH_TIMEOUT)
+            for call in jobs.values()
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        return self._merge_results(ticker, dict(zip(jobs, results)))
 
-            hist = stock.history(start=start_date, end=end_date)[['Close', 'Volume']] # Only get Close and Volume
-            if not hist.empty:
-                hist_trimmed = hist.tail(max_history_points).reset_index().to_dict(orient="records")
+    def fetch_stock_data_sync(self, ticker: str, period: str = "1m") -> Dict[str, Any]:
+        """Blocking variant of fetch_stock_data for callers without an event loop"""
+        jobs = self._fetch_jobs(ticker, period)
+        futures = {section: _fetch_executor.submit(call) for section, call in jobs.items()}
+        # All calls start together, so one shared deadline equals a per-call timeout
+        deadline = time.monotonic() + FETCH_TIMEOUT
+        results = {}
+        for section, future in futures.items():
+            try:
+                results[section] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                results[section] = asyncio.TimeoutError()
+            except Exception as e:
+                results[section] = e
+        return self._merge_results(ticker, results)
+
+    def _fetch_jobs(self, ticker: str, period: str) -> Dict[str, Any]:
+        """Output section -> zero-argument callable reading it through the cache"""
+        cache = get_market_cache()
+        return {
+            "info": lambda: cache.get_or_fetch("info", ticker, lambda: self._fetch_info(ticker)),
+            "historical_data": lambda: cache.get_or_fetch("history", f"{ticker}:{period}", lambda: self._fetch_history(ticker, period)),
+            "financials": lambda: cache.get_or_fetch("financials", ticker, lambda: self._fetch_financials(ticker)),
+            "balance_sheet": lambda: cache.get_or_fetch("balance_sheet", ticker, lambda: self._fetch_balance_sheet(ticker)),
+            "cash_flow": lambda: cache.get_or_fetch("cashflow", ticker, lambda: self._fetch_cash_flow(ticker)),
+        }
+
+    @staticmethod
+    def _merge_results(ticker: str, results: Dict[str, Any]) -> Dict[str, Any]:
+        data, errors = {}, {}
+        for section, result in results.items():
+            if isinstance(result, BaseException):
+                reason = f"timed out after {FETCH_TIMEOUT}s" if isinstance(result, asyncio.TimeoutError) else str(result)
+                print(f"Error fetching {section} for {ticker}: {reason}")
+                data[section], errors[section] = None, reason
             else:
-                hist_trimmed = []
-
-
-            # Fetch key financial statements (simplify to annual)
-            financials = stock.financials.to_dict() if hasattr(stock, 'financials') else {}
-            latest_financials = financials.get(list(financials.keys())[0] if financials else {}, {})
-            simplified_financials = {
-                'totalRevenue': latest_financials.get('Total Revenue'),
-                'netIncome': latest_financials.get('Net Income'),
-                'grossProfit': latest_financials.get('Gross Profit')
-            }
-
-            balance_sheet = stock.balance_sheet.to_dict() if hasattr(stock, 'balance_sheet') else {}
-            latest_balance_sheet = balance_sheet.get(list(balance_sheet.keys())[0] if balance_sheet else {}, {})
-            simplified_balance_sheet = {
-                'totalAssets': latest_balance_sheet.get('Total Assets'),
-                'totalLiabilities': latest_balance_sheet.get('Total Liabilities Net Minority Interest'),
-                'commonStockEquity': latest_balance_sheet.get('Common Stock Equity')
-            }
-
-            cash_flow = stock.cashflow.to_dict() if hasattr(stock, 'cashflow') else {}
-            latest_cash_flow = cash_flow.get(list(cash_flow.keys())[0] if cash_flow else {}, {})
-            simplified_cash_flow = {
-                'operatingCashFlow': latest_cash_flow.get('Operating Cash Flow'),
-                'freeCashFlow': latest_cash_flow.get('Free Cash Flow')
-            }
-            return {
-                "info": simplified_info,
-                "historical_data": hist_trimmed,
-                "financials": simplified_financials,
-                "balance_sheet": simplified_balance_sheet,
-                "cash_flow": simplified_cash_flow
-            }
+                data[section] = result
+        if len(errors) == len(results):
+            return {"error": "; ".join(f"{section}: {reason}" for section, reason in errors.items())}
+        if errors:
+            data["errors"] = errors
+        return data
 
-        except Exception as e:
-            print(f"Error fetching data for {ticker}: {e}")
-            return {"error": str(e)}
+    @staticmethod
+    def _fetch_info(ticker: str) -> Dict[str, Any]:
+        info = yf.Ticker(ticker).info
+        return {
+            'symbol': info.get('symbol'),
+            'shortName': info.get('shortName'),
+            'industry': info.get('industry'),
+            'sector': info.get('sector'),
+            'currentPrice': info.get('currentPrice'),
+            'previousClose': info.get('previousClose'),
+            'marketCap': info.get('marketCap'),
+            'trailingPE': info.get('trailingPE'),
+            'forwardPE': info.get('forwardPE'),
+            'recommendationMean': info.get('recommendationMean')
+        }
+
+    @staticmethod
+    def history_window(period: str):
+        """Start date, end date and number of points kept for a history period"""
+        end_date = datetime.now()
+        if period.endswith('y'):
+            start_date = end_date - timedelta(days=365 * int(period[:-1]))
+            max_history_points = 90
+        elif period.endswith('m'):
+            start_date = end_date - timedelta(days=30 * int(period[:-1]))
+            max_history_points = 60
+        else:
+            start_date = end_date - timedelta(days=30)  # Default to 1 months
+            max_history_points = 30
+        if COMPACTION_ENABLED:
+            # The model gets summary statistics rather than rows, so keep the whole period
+            max_history_points = (end_date - start_date).days
+        return start_date, end_date, max_history_points
+
+    @staticmethod
+    def history_records(hist, max_history_points: int) -> list:
+        """Trim a price history frame to Date/Close/Volume records"""
+        hist = hist[['Close', 'Volume']].dropna(subset=['Close']) # Only get Close and Volume
+        if hist.empty:
+            return []
+        hist_trimmed = hist.tail(max_history_points).reset_index()
+        hist_trimmed = hist_trimmed.rename(columns={hist_trimmed.columns[0]: 'Date'})
+        # ISO dates keep the rows JSON-serializable for the cache
+        hist_trimmed['Date'] = hist_trimmed['Date'].dt.strftime('%Y-%m-%d')
+        return hist_trimmed.to_dict(orient="records")
+
+    @staticmethod
+    def summarize_history(records: list) -> Dict[str, Any]:
+        """
+        Summary statistics of Date/Close/Volume records
+
+        Returns over the trailing horizons the window covers, annualized
+        volatility of daily log returns, max drawdown, the period high and
+        low, moving averages and the recent volume trend.
+        """
+        if not records:
+            return {}
+        dates = [record["Date"] for record in records]
+        close = np.array([record["Close"] for record in records], dtype=float)
+        volume = np.array([record.get("Volume") or 0 for record in records], dtype=float)
+        n = len(close)
+
+        returns = {name: close[-1] / close[-1 - days] - 1 for name, days in RETURN_HORIZONS.items() if n > days}
+        returns["window"] = close[-1] / close[0] - 1
+        log_returns = np.diff(np.log(close))
+        drawdowns = close / np.maximum.accumulate(close) - 1
+        trough = int(drawdowns.argmin())
+        peak = int(close[:trough + 1].argmax())
+        recent = volume[-21:]
+        earlier = volume[:-21]
+
+        return {
+            "start": dates[0],
+            "end": dates[-1],
+            "trading_days": n,
+            "last_close": close[-1],
+            "returns": returns,
+            "volatility_annualized": float(log_returns.std(ddof=1) * np.sqrt(252)) if n > 2 else None,
+            "max_drawdown": {"value": float(drawdowns[trough]), "peak": dates[peak], "trough": dates[trough]},
+            "high": {"close": float(close.max()), "date": dates[int(close.argmax())]},
+            "low": {"close": float(close.min()), "date": dates[int(close.argmin())]},
+            "moving_averages": {str(days): float(close[-days:].mean()) for days in MOVING_AVERAGES if n >= days},
+            "volume": {
+                "avg_1m": float(recent.mean()),
+                "avg_window": float(volume.mean()),
+                "trend_1m_vs_prior": float(recent.mean() / earlier.mean() - 1) if earlier.size and earlier.mean() else None,
+            },
+        }
+
+    @classmethod
+    def _fetch_history(cls, ticker: str, period: str) -> list:
+        # Fetch historical data
+        start_date, end_date, max_history_points = cls.history_window(period)
+        hist = yf.Ticker(ticker).history(start=start_date, end=end_date)
+        return cls.history_records(hist, max_history_points)
+
+    @staticmethod
+    def _latest_column(frame) -> Dict[str, Any]:
+        # Statements are indexed by line item with one column per fiscal period, newest first
+        statement = frame.to_dict() if frame is not None else {}
+        return statement.get(list(statement.keys())[0], {}) if statement else {}
+
+    @classmethod
+    def _fetch_financials(cls, ticker: str) -> Dict[str, Any]:
+        # Fetch key financial statements (simplify to annual)
+        latest_financials = cls._latest_column(yf.Ticker(ticker).financials)
+        return {
+            'totalRevenue': latest_financials.get('Total Revenue'),
+            'netIncome': latest_financials.get('Net Income'),
+            'grossProfit': latest_financials.get('Gross Profit')
+        }
+
+    @classmethod
+    def _fetch_balance_sheet(cls, ticker: str) -> Dict[str, Any]:
+        latest_balance_sheet = cls._latest_column(yf.Ticker(ticker).balance_sheet)
+        return {
+            'totalAssets': latest_balance_sheet.get('Total Assets'),
+            'totalLiabilities': latest_balance_sheet.get('Total Liabilities Net Minority Interest'),
+            'commonStockEquity': latest_balance_sheet.get('Common Stock Equity')
+        }
+
+    @classmethod
+    def _fetch_cash_flow(cls, ticker: str) -> Dict[str, Any]:
+        latest_cash_flow = cls._latest_column(yf.Ticker(ticker).cashflow)
+        return {
+            'operatingCashFlow': latest_cash_flow.get('Operating Cash Flow'),
+            'freeCashFlow': latest_cash_flow.get('Free Cash Flow')
+        }
 
     def _is_valid_value(self, v: Any) -> bool:
         """Helper function to check if a value is valid (not empty or all NaN)."""
@@ -0,0 +1,128 @@
+# app/analytics.py
+import threading
+from typing import Dict, Any, List, Optional
+import numpy as np
+from app.dataset import ColumnarDataset
+
+# Ratio name -> (numerator fields, denominator fields); multiple fields are summed
+RATIO_DEFINITIONS = {
+    "roe": (["net_income"], ["shareholders_equity"]),
+    "roa": (["net_income"], ["total_asset"]),
+    "debt_to_equity": (["long_term_debt", "current_debt"], ["shareholders_equity"]),
+    "current_ratio": (["total_current_asset"], ["total_current_liab"]),
+    "net_margin": (["net_income"], ["total_revenue"]),
+}
+GROWTH_FIELDS = ["total_revenue", "net_income", "shareholders_equity", "total_asset"]
+CAGR_HORIZONS = [3, 5]
+
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Elementwise division that yields NaN for missing or zero denominators"""
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    valid = np.isfinite(numerator) & np.isfinite(denominator) & (denominator != 0)
+    np.divide(numerator, denominator, out=out, where=valid)
+    return out
+
+
+def _sum_fields(columns: Dict[str, np.ndarray], fields: List[str]) -> np.ndarray:
+    """Sum of fields treating a missing component as 0, NaN only if all are missing"""
+    stacked = np.vstack([np.asarray(columns[field], dtype=np.float64) for field in fields])
+    total = np.nansum(stacked, axis=0)
+    total[np.all(np.isnan(stacked), axis=0)] = np.nan
+    return total
+
+
+def _lagged_index(company_ids: np.ndarray, fiscal_years: np.ndarray, lag: int) -> np.ndarray:
+    """
+    Row index of the same company's record `lag` fiscal years earlier, or -1
+
+    Rows are sorted by (company_id, fiscal_year), so a combined integer key is
+    monotonic and one searchsorted resolves every row at once.
+    """
+    keys = company_ids.astype(np.int64) * 10000 + fiscal_years.astype(np.int64)
+    targets = keys - lag
+    idx = np.searchsorted(keys, targets, side="left")
+    idx_clipped = np.minimum(idx, len(keys) - 1)
+    found = (idx < len(keys)) & (keys[idx_clipped] == targets)
+    return np.where(found, idx_clipped, -1)
+
+
+def compute_metrics(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Compute ratios, YoY growth and CAGR for every row in one batched pass
+
+    Args:
+        columns: Column arrays sorted by (company_id, fiscal_year), as in ColumnarDataset
+
+    Returns:
+        Dict of metric name -> float64 array aligned with the input rows (NaN where undefined)
+    """
+    company_ids = np.asarray(columns["company_id"])
+    fiscal_years = np.asarray(columns["fiscal_year"])
+    metrics: Dict[str, np.ndarray] = {}
+
+    for name, (numerator, denominator) in RATIO_DEFINITIONS.items():
+        metrics[name] = safe_divide(_sum_fields(columns, numerator), _sum_fields(columns, denominator))
+
+    prev = _lagged_index(company_ids, fiscal_years, 1)
+    has_prev = prev >= 0
+    for field in GROWTH_FIELDS:
+        values = np.asarray(columns[field], dtype=np.float64)
+        previous = np.where(has_prev, values[np.maximum(prev, 0)], np.nan)
+        # abs() keeps the sign meaningful when the base year is a loss
+        metrics[f"{field}_yoy"] = safe_divide(values - previous, np.abs(previous))
+
+    for horizon in CAGR_HORIZONS:
+        base_idx = _lagged_index(company_ids, fiscal_years, horizon)
+        has_base = base_idx >= 0
+        for field in ("total_revenue", "net_income"):
+            values = np.asarray(columns[field], dtype=np.float64)
+            base = np.where(has_base, values[np.maximum(base_idx, 0)], np.nan)
+            # CAGR is only defined between two positive values
+            valid = (values > 0) & (base > 0)
+            ratio = np.where(valid, safe_divide(values, base), np.nan)
+            with np.errstate(invalid="ignore"):
+                metrics[f"{field}_cagr_{horizon}y"] = np.power(ratio, 1.0 / horizon) - 1.0
+
+    return metrics
+
+
+class FinancialAnalytics:
+    """Per-process cache of metrics computed over the whole compiled dataset"""
+
+    def __init__(self, dataset: ColumnarDataset):
+        self.dataset = dataset
+        self._metrics: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def metrics(self) -> Dict[str, np.ndarray]:
+        if self._metrics is None:
+            with self._lock:
+                if self._metrics is None:
+                    self._metrics = compute_metrics(self.dataset.columns)
+        return self._metrics
+
+    def get_company_metrics(self, company_id: str, years: int = 5, precision: int = 4) -> List[Dict[str, Any]]:
+        """
+        Metrics for a company's most recent fiscal years
+
+        Args:
+            company_id: Company ID from the dataset
+            years: Number of most recent fiscal years to return
+            precision: Decimal places to round ratios to
+
+        Returns:
+            One dict per fiscal year, oldest first, with None for undefined values
+        """
+        rows = self.dataset.recent_rows(company_id, years)
+        fiscal_years = self.dataset.columns["fiscal_year"][rows]
+        selected = {name: values[rows] for name, values in self.metrics.items()}
+        out = []
+        for i, year in enumerate(fiscal_years):
+            item = {"fiscal_year": int(year)}
+            for name, values in selected.items():
+                value = float(values[i])
+                item[name] = round(value, precision) if np.isfinite(value) else None
+            out.append(item)
+        return out
@@ -0,0 +1,205 @@
+# app/artifacts.py
+import asyncio
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from app.metrics import RENDER_SECONDS
+
+# Rendered formats stored next to each markdown report
+ARTIFACT_EXTENSIONS = ("html", "pdf")
+
+_render_locks: Dict[str, threading.Lock] = {}
+_render_locks_guard = threading.Lock()
+
+
+def artifact_path(report_path: str, extension: str) -> str:
+    """Path of a rendered artifact that sits next to the markdown report"""
+    return os.path.splitext(report_path)[0] + "." + extension
+
+
+def is_fresh(report_path: str, extension: str) -> bool:
+    """True if the artifact exists and is at least as new as the markdown"""
+    path = artifact_path(report_path, extension)
+    try:
+        return os.stat(path).st_mtime_ns >= os.stat(report_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def fresh_artifacts(report_path: str) -> list:
+    """Extensions whose artifact is rendered and up to date"""
+    return [extension for extension in ARTIFACT_EXTENSIONS if is_fresh(report_path, extension)]
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def render_artifact(report_path: str, extension: str) -> str:
+    """
+    Render one artifact for a markdown report, unless a fresh one exists
+
+    A per-file lock makes concurrent requests for the same artifact render
+    it once; the file is written atomically so readers never see a partial one.
+
+    Returns:
+        Path to the artifact
+    """
+    # Imported lazily so the API process only loads WeasyPrint when it renders
+    from app.utils import markdown_to_html, markdown_to_pdf
+
+    path = artifact_path(report_path, extension)
+    with _render_locks_guard:
+        lock = _render_locks.setdefault(path, threading.Lock())
+    with lock:
+        if is_fresh(report_path, extension):
+            return path
+        started = time.perf_counter()
+        if extension == "html":
+            with open(report_path, "r") as f:
+                _write_atomic(path, markdown_to_html(f.read()).encode("utf-8"))
+        elif extension == "pdf":
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                markdown_to_pdf(report_path, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        else:
+            raise ValueError(f"Unknown artifact type: {extension}")
+        RENDER_SECONDS.labels(extension).observe(time.perf_counter() - started)
+    return path
+
+
+def render_artifacts(report_path: str) -> Dict[str, str]:
+    """
+    Render every artifact for a finished report
+
+    Failures are reported, not raised: a missing artifact is rendered
+    lazily on first download instead.
+
+    Returns:
+        Extension -> path for the artifacts that were rendered
+    """
+    rendered = {}
+    for extension in ARTIFACT_EXTENSIONS:
+        try:
+            rendered[extension] = render_artifact(report_path, extension)
+        except Exception as e:
+            print(f"Failed to render {extension} for {report_path}: {str(e)}")
+    return rendered
+
+
+async def ensure_artifact(report_path: str, extension: str) -> str:
+    """
+    Return the artifact path, rendering it in the render pool if missing or stale
+
+    Raises:
+        RenderServiceBusy: If the render pool's queue is full
+    """
+    if is_fresh(report_path, extension):
+        return artifact_path(report_path, extension)
+    if extension == "html":
+        # Markdown to HTML is cheap; a thread is enough
+        return await asyncio.get_running_loop().run_in_executor(None, render_artifact, report_path, extension)
+    from app.rendering import render_service
+    return await render_service.render(report_path, extension)
+
+
+def _etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple]:
+    """
+    Parse a single "bytes=start-end" range
+
+    Returns:
+        (start, end) inclusive, None to ignore the header and send the
+        whole file, or () when the range can't be satisfied
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length <= 0:
+                return ()
+            return (max(0, size - length), size - 1)
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        return ()
+    return (first, min(last, size - 1))
+
+
+def artifact_response(request: Request, path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    """
+    Serve a stored artifact with validators, conditional GET and byte ranges
+
+    Args:
+        request: Incoming request, for If-None-Match / If-Modified-Since / Range
+        path: File to serve
+        media_type: Content type of the file
+        filename: Download name; sets Content-Disposition to attachment
+
+    Returns:
+        200 with the file, 206 with a byte range, 304 if the client copy is current,
+        or 416 for an unsatisfiable range
+    """
+    stat = os.stat(path)
+    etag = _etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since:
+        try:
+            if int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range == ():
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range:
+            start, end = byte_range
+            with open(path, "rb") as f:
+                f.seek(start)
+                content = f.read(end - start + 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            if filename:
+                headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return Response(content=content, status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path=path, media_type=media_type, filename=filename, headers=headers, stat_result=stat)
@@ -1,14 +1,116 @@
 # app/auth.py
+import argparse
+import asyncio
+import time
+import threading
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status
 from fastapi.security import APIKeyHeader
-from app.database import get_db_connection
+from app.database import fetch_one, execute
 from typing import Optional, Dict, Any, Union
 from config.config_load import CONFIG
 from app.jwt_auth import get_current_user_jwt
+from app.metrics import AUTH_CACHE_LOOKUPS
 
 # API key header extractor
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+class UserCache:
+    """
+    Bounded LRU cache with per-entry TTL for resolved users
+
+    Stores None for credentials that did not resolve to an active user
+    (negative caching) with a shorter TTL, so repeated bad keys don't reach
+    MySQL either. Entries are indexed by user_id for explicit invalidation.
+    The cache is per process: set_user_active clears the calling process
+    only, and every other process picks the change up within ttl.
+    """
+    MISS = object()
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0, negative_ttl: float = 10.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._keys_by_user: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "negative_hits": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: tuple) -> Any:
+        """Return the cached user (or None for a cached rejection), else UserCache.MISS"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self._counters["misses"] += 1
+                AUTH_CACHE_LOOKUPS.labels("miss").inc()
+                return self.MISS
+            self._entries.move_to_end(key)
+            if entry[1] is None:
+                self._counters["negative_hits"] += 1
+                AUTH_CACHE_LOOKUPS.labels("negative_hit").inc()
+            else:
+                self._counters["hits"] += 1
+                AUTH_CACHE_LOOKUPS.labels("hit").inc()
+            return entry[1]
+
+    def set(self, key: tuple, user: Optional[Dict[str, Any]]):
+        """Cache a resolved user, or None to remember a rejected credential"""
+        ttl = self.ttl if user is not None else self.negative_ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, user)
+            if user is not None:
+                self._keys_by_user.setdefault(user["user_id"], set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def invalidate(self, key: tuple):
+        """Drop a single cached credential"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._counters["invalidations"] += 1
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached credential that resolved to user_id"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+                self._counters["invalidations"] += 1
+            self._keys_by_user.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["negative_hits"] + self._counters["misses"]
+            hit_rate = (self._counters["hits"] + self._counters["negative_hits"]) / lookups if lookups else 0.0
+            return {"size": len(self._entries), "max_size": self.max_size, "hit_rate": round(hit_rate, 4), **self._counters}
+
+    def _remove(self, key: tuple):
+        _, user = self._entries.pop(key)
+        if user is not None:
+            keys = self._keys_by_user.get(user["user_id"])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[user["user_id"]]
+
+
+user_cache = UserCache(
+    max_size=CONFIG["app"].get("AUTH_CACHE_SIZE", 1024),
+    ttl=CONFIG["app"].get("AUTH_CACHE_TTL", 60),
+    negative_ttl=CONFIG["app"].get("AUTH_CACHE_NEGATIVE_TTL", 10)
+)
+
 async def get_user_from_api_key(api_key: str) -> Optional[Dict[str, Any]]:
     """
     Get user information from API key
@@ -22,23 +124,47 @@ async def get_user_from_api_key(api_key: str) -> Optional[Dict[str, Any]]:
     if not api_key:
         return None
     
-    conn = get_db_connection()
+    key = ("api_key", api_key)
+    cached = user_cache.get(key)
+    if cached is not UserCache.MISS:
+        return cached
+
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT user_id, username 
-                FROM users 
-                WHERE api_key = %s AND is_active = TRUE
-                """,
-                (api_key,)
-            )
-            user = cursor.fetchone()
-            return user
+        user = await fetch_one(
+            """
+            SELECT user_id, username 
+            FROM users 
+            WHERE api_key = %s AND is_active = TRUE
+            """,
+            (api_key,)
+        )
     except Exception:
+        # Don't cache database failures as rejections
         return None
-    finally:
-        conn.close()
+    user_cache.set(key, user)
+    return user
+
+async def set_user_active(user_id: str, is_active: bool) -> bool:
+    """
+    Activate or deactivate a user and drop their cached credentials
+
+    Other processes keep serving their cached copy for up to AUTH_CACHE_TTL
+    seconds. JWTs are not checked against is_active: a deactivated user's
+    tokens stay valid until they expire (ACCESS_TOKEN_EXPIRE_MINUTES).
+
+    Args:
+        user_id: The user to update
+        is_active: New value of users.is_active
+
+    Returns:
+        True if a user row was updated
+    """
+    updated = await execute(
+        "UPDATE users SET is_active = %s WHERE user_id = %s",
+        (is_active, user_id)
+    )
+    user_cache.invalidate_user(user_id)
+    return bool(updated)
 
 async def get_current_user_from_token_or_api_key(
     token_user: Optional[Dict[str, Any]] = Depends(get_current_user_jwt),
@@ -71,4 +197,28 @@ async def get_current_user_from_token_or_api_key(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
-    )
\ No newline at end of file
+    )
+
+
+async def _set_active_by_username(username: str, is_active: bool) -> bool:
+    user = await fetch_one("SELECT user_id FROM users WHERE username = %s", (username,))
+    if user is None:
+        return False
+    # Zero updated rows just means the user already had that state
+    await set_user_active(user["user_id"], is_active)
+    return True
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Activate or deactivate API users")
+    parser.add_argument("command", choices=["activate", "deactivate"])
+    parser.add_argument("username")
+    args = parser.parse_args(argv)
+    if not asyncio.run(_set_active_by_username(args.username, args.command == "activate")):
+        raise SystemExit(f"User not found: {args.username}")
+    print(f"{args.command.capitalize()}d {args.username}; API processes drop cached credentials "
+          f"within {user_cache.ttl:g}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,35 @@
 # app/data_loader.py
-import json
 from pathlib import Path
 from typing import Dict, Any, List
 from config.config_load import CONFIG
+from app.dataset import ColumnarDataset
+from app.analytics import FinancialAnalytics
 
 class DataLoader:
+    # Line items handed to the agent for each fiscal year
+    REPORT_FIELDS = [
+        'total_revenue',
+        'net_income',
+        'shareholders_equity',
+        'total_asset',
+        'total_liab',
+        'cash_and_cash_equivalents',
+        'long_term_debt',
+        'shares_outstanding'
+    ]
+
     def __init__(self):
         self.data_path = Path(CONFIG["app"]["data_path"])
-        self.company_metadata = self._load_metadata()
-        self.financial_data = self._load_financial_data()
+        compiled_path = CONFIG["app"].get("compiled_data_path")
+        self.dataset = ColumnarDataset.open(self.data_path, Path(compiled_path) if compiled_path else None)
+        self.company_metadata = self.dataset.metadata
         self.valid_company_ids = set(self.company_metadata.keys())
+        self.analytics = FinancialAnalytics(self.dataset)
 
-    def _load_metadata(self) -> Dict[str, Any]:
-        """Load company metadata from JSON file"""
-        try:
-            with open(self.data_path / "company_metadata.json") as f:
-                return {str(item["company_id"]): item for item in json.load(f)}
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            raise RuntimeError(f"Failed to load metadata: {str(e)}")
-
-    def _load_financial_data(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Load company financial data from JSON file"""
-        try:
-            with open(self.data_path / "company_financial_ratios.json") as f:
-                data = json.load(f)
-                
-                result = {}
-                for item in data:
-                    company_id = str(item["company_id"])
-                    if company_id not in result:
-                        result[company_id] = []
-                    result[company_id].append(item)
-                return result
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            raise RuntimeError(f"Failed to load financial data: {str(e)}")
+    @property
+    def dataset_version(self) -> str:
+        """Content hash of the source JSON the compiled dataset was built from"""
+        return self.dataset.dataset_version
 
     def validate_company(self, company_id: str) -> bool:
         """Check if company exists in metadata"""
@@ -43,32 +39,28 @@ class DataLoader:
         """Get combined data for report generation"""
         if not self.validate_company(company_id):
             raise ValueError("Invalid company ID")
-        metadata = self.company_metadata[company_id]
+        metadata = dict(self.company_metadata[company_id])
         if "ticker" in metadata and isinstance(metadata["ticker"], str):
             metadata["ticker"] = metadata["ticker"].split(" ")[0]
 
-        financial_data = self.financial_data.get(company_id, [])
-        recent_years = sorted(list(set(item['fiscal_year'] for item in financial_data)), reverse=True)[:5]
-
-        simplified_financial_data = []
-        for item in financial_data:
-            if item['fiscal_year'] in recent_years:
-                simplified_financial_data.append({
-                    'fiscal_year': item['fiscal_year'],
-                    'total_revenue': item.get('total_revenue'),
-                    'net_income': item.get('net_income'),
-                    'shareholders_equity': item.get('shareholders_equity'),
-                    'total_asset': item.get('total_asset'),
-                    'total_liab': item.get('total_liab'),
-                    'cash_and_cash_equivalents': item.get('cash_and_cash_equivalents'),
-                    'long_term_debt': item.get('long_term_debt'),
-                    'shares_outstanding': item.get('shares_outstanding')
-                })
+        rows = self.dataset.recent_rows(company_id, 5)
+        simplified_financial_data = self.dataset.records(rows, ['fiscal_year'] + self.REPORT_FIELDS)
 
         return {
             "metadata": metadata,
             "financial_data": simplified_financial_data
         }
 
+    def get_company_ratios(self, company_id: str, years: int = 5) -> Dict[str, Any]:
+        """Get precomputed ratios, growth rates and CAGR for the most recent years"""
+        if not self.validate_company(company_id):
+            raise ValueError("Invalid company ID")
+        return {
+            "company_id": company_id,
+            "company_name": self.company_metadata[company_id].get("company_name"),
+            "dataset_version": self.dataset_version,
+            "ratios": self.analytics.get_company_metrics(company_id, years)
+        }
+
 # Singleton instance
 data_loader = DataLoader()
\ No newline at end of file
@@ -3,15 +3,27 @@ import pymysql
 from pymysql import cursors
 from pymysql.err import OperationalError
 import uuid
-from passlib.context import CryptContext
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config_load import CONFIG
+from app.passwords import pwd_context
+from app.metrics import DB_POOL_WAIT_SECONDS, DB_QUERY_SECONDS
 
-    
-def get_db_connection():
-    """Create MySQL connection using TOML config"""
+
+class PoolTimeoutError(OperationalError):
+    """Raised when no pooled connection becomes available within the timeout"""
+
+
+def _connect():
+    """Open a new raw MySQL connection using TOML config"""
     return pymysql.connect(
         host=CONFIG["database"]["host"],
         user=CONFIG["database"]["user"],
@@ -20,6 +32,394 @@ def get_db_connection():
         cursorclass=cursors.DictCursor
     )
 
+
+class PooledConnection:
+    """
+    Proxy around a pymysql connection checked out from a ConnectionPool.
+
+    Behaves like the underlying connection, except that close() hands the
+    connection back to the pool instead of tearing down the socket.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn, created_at: float):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise OperationalError("Connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        """Return the connection to the pool"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool._release(conn, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of pymysql connections.
+
+    Connections are checked with a ping before being handed out and are
+    recycled once they exceed max_lifetime seconds, so stale sockets dropped
+    by MySQL's wait_timeout never reach callers.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_lifetime: float = 3600.0,
+        pre_ping: bool = True,
+        connect: Callable = _connect
+    ):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self._connect = connect
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._counters = {
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "health_check_failures": 0,
+            "acquired": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check out a connection, opening a new one if the pool has spare capacity
+
+        Raises:
+            PoolTimeoutError: If the pool stays exhausted for longer than timeout
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn, created_at = None, None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise OperationalError("Connection pool is closed")
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                conn, created_at = self._open()
+            elif not self._is_usable(conn, created_at):
+                self._discard(conn)
+                conn, created_at = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        DB_POOL_WAIT_SECONDS.observe(waited)
+        with self._cond:
+            self._counters["acquired"] += 1
+            self._counters["wait_seconds_total"] += waited
+        return PooledConnection(self, conn, created_at)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks out a connection and always returns it"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool size and usage counters"""
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                **self._counters,
+            }
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._counters["connections_created"] += 1
+        return conn, time.monotonic()
+
+    def _is_usable(self, conn, created_at: float) -> bool:
+        if self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            with self._cond:
+                self._counters["connections_recycled"] += 1
+            return False
+        if self.pre_ping:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._counters["health_check_failures"] += 1
+                return False
+        return True
+
+    def _release(self, conn, created_at: float):
+        # Drop whatever the caller left uncommitted so the next user starts clean
+        try:
+            conn.rollback()
+            reusable = not self._closed
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            if reusable:
+                self._idle.append((conn, created_at))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not reusable:
+            self._discard(conn)
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _new_pool(max_size: Optional[int] = None) -> ConnectionPool:
+    db_config = CONFIG["database"]
+    return ConnectionPool(
+        max_size=max_size or db_config.get("pool_size", 10),
+        timeout=db_config.get("pool_timeout", 30),
+        max_lifetime=db_config.get("pool_recycle", 3600),
+        pre_ping=db_config.get("pool_pre_ping", True)
+    )
+
+
+def configure_pool(max_size: Optional[int] = None) -> ConnectionPool:
+    """
+    (Re)create the process-wide connection pool
+
+    Args:
+        max_size: Pool size, defaults to database.pool_size from config.
+                  Celery workers pass database.worker_pool_size instead.
+
+    Returns:
+        The new pool
+    """
+    global _pool, _pool_pid, _executor
+    with _pool_lock:
+        old_pool, old_pid, old_executor = _pool, _pool_pid, _executor
+        _pool = _new_pool(max_size)
+        _pool_pid = os.getpid()
+        _executor = None
+    # Sockets inherited across fork belong to the parent, so leave them alone
+    if old_pool is not None and old_pid == _pool_pid:
+        old_pool.close()
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it lazily (and again after fork)"""
+    global _pool, _pool_pid, _executor
+    pool = _pool
+    if pool is not None and _pool_pid == os.getpid():
+        return pool
+    with _pool_lock:
+        # Re-checked under the lock so concurrent first callers share one pool.
+        # Anything left is a parent's pool inherited across fork: not ours to close.
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = _new_pool()
+            _pool_pid = os.getpid()
+            _executor = None
+        return _pool
+
+
+def close_pool():
+    """Close the process-wide pool and its executor"""
+    global _pool, _executor
+    with _pool_lock:
+        pool, executor = _pool, _executor
+        _pool, _executor = None, None
+    if pool is not None:
+        pool.close()
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool metrics for the current process"""
+    return get_pool().stats()
+
+
+def get_db_connection():
+    """Check out a pooled MySQL connection; close() returns it to the pool"""
+    return get_pool().acquire()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    pool = get_pool()
+    with _pool_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix="db")
+        return _executor
+
+
+async def run_db(func: Callable, *args, **kwargs):
+    """
+    Run func(conn, *args, **kwargs) with a pooled connection off the event loop
+
+    Work is queued on a thread pool sized to the connection pool, so waiting
+    for a free connection never blocks the event loop itself.
+    """
+    pool = get_pool()
+
+    def call():
+        with pool.connection() as conn:
+            return func(conn, *args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_get_executor(), call)
+    finally:
+        DB_QUERY_SECONDS.labels(func.__name__.lstrip("_")).observe(time.perf_counter() - started)
+
+
+def _fetch_one(conn, query: str, params=None):
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+
+
+def _fetch_all(conn, query: str, params=None):
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def _execute(conn, query: str, params=None) -> int:
+    try:
+        with conn.cursor() as cursor:
+            rowcount = cursor.execute(query, params)
+        conn.commit()
+        return rowcount
+    except Exception:
+        conn.rollback()
+        raise
+
+
+async def fetch_one(query: str, params=None) -> Optional[Dict[str, Any]]:
+    """Run a SELECT on the pool and return the first row"""
+    return await run_db(_fetch_one, query, params)
+
+
+async def fetch_all(query: str, params=None) -> list:
+    """Run a SELECT on the pool and return all rows"""
+    return await run_db(_fetch_all, query, params)
+
+
+async def execute(query: str, params=None) -> int:
+    """Run a write statement on the pool and commit it"""
+    return await run_db(_execute, query, params)
+
+
+# Columns and indexes added after the original schema; applied by migrate_db
+TASK_COLUMNS = [
+    ("cache_key", "VARCHAR(64) NULL"),
+    ("source_task_id", "VARCHAR(36) NULL"),
+]
+TASK_INDEXES = [
+    ("idx_tasks_cache_key", "(cache_key, status, completed_at)"),
+    ("idx_tasks_source_task", "(source_task_id)"),
+    # Keyset pagination for GET /tasks, newest first, optionally filtered
+    ("idx_tasks_user_created", "(user_id, created_at, task_id)"),
+    ("idx_tasks_user_status_created", "(user_id, status, created_at, task_id)"),
+    # status trails so a company + status filter is answered from the index too
+    ("idx_tasks_user_company_created_status", "(user_id, company_id, created_at, task_id, status)"),
+]
+TRACE_COLUMNS = [
+    ("agent_mode", "VARCHAR(20) NULL"),
+]
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """,
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+def migrate_db(cursor):
+    """Bring existing tasks and task_traces tables up to date; safe to run repeatedly"""
+    for column, definition in TASK_COLUMNS:
+        if not _column_exists(cursor, "tasks", column):
+            cursor.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            print(f"Added column tasks.{column}")
+    for index, columns in TASK_INDEXES:
+        if not _index_exists(cursor, "tasks", index):
+            cursor.execute(f"CREATE INDEX {index} ON tasks {columns}")
+            print(f"Added index {index}")
+    for column, definition in TRACE_COLUMNS:
+        if not _column_exists(cursor, "task_traces", column):
+            cursor.execute(f"ALTER TABLE task_traces ADD COLUMN {column} {definition}")
+            print(f"Added column task_traces.{column}")
+
 # Initialize the database(only need once for creating table)
 def init_db():
     conn = get_db_connection()
@@ -52,10 +452,33 @@ def init_db():
                     FOREIGN KEY (user_id) REFERENCES users(user_id)
                 )          
             """)
+            # Create task_traces table: one structured trace per agent run
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS task_traces (
+                    task_id VARCHAR(36) PRIMARY KEY,
+                    company_id VARCHAR(20) NOT NULL,
+                    status ENUM('success', 'failed') NOT NULL,
+                    model VARCHAR(100),
+                    prompt_version VARCHAR(12),
+                    agent_mode VARCHAR(20),
+                    wall_seconds DOUBLE NOT NULL,
+                    llm_turns INT NOT NULL,
+                    tool_calls INT NOT NULL,
+                    input_tokens INT NOT NULL,
+                    output_tokens INT NOT NULL,
+                    cached_tokens INT NOT NULL,
+                    tool_payload_chars INT NOT NULL,
+                    trace MEDIUMBLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_traces_created (created_at),
+                    FOREIGN KEY (task_id) REFERENCES tasks(task_id)
+                )
+            """)
+            migrate_db(cursor)
             # Insert the admin user if it doesn't exist
             admin_username = CONFIG["app"]["DEFAULT_USERNAME"]
             admin_password = CONFIG["app"]["DEFAULT_PASSWORD"] 
-            hashed_password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(admin_password)
+            hashed_password = pwd_context.hash(admin_password)
             admin_user_id = str(uuid.uuid4())
             admin_api_key = CONFIG["app"]["API_KEY"] 
 
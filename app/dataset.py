@@ -0,0 +1,270 @@
+# app/dataset.py
+"""
+Compiled, memory-mapped columnar form of the financial dataset.
+
+File layout (all offsets from start of file, blocks 64-byte aligned):
+
+    magic      8 bytes   b"ERCOL1\\0\\0"
+    hdr_len    8 bytes   little-endian uint64
+    header     hdr_len   UTF-8 JSON: columns, row count, company index,
+                         company metadata, source file signatures
+    columns    one contiguous little-endian array per field
+
+Rows are sorted by (company_id, fiscal_year), so each company occupies a
+single row range. Columns are opened with np.memmap, so every process that
+opens the file shares the same page-cache pages instead of holding its own
+parsed copy of the JSON.
+
+Compile from the command line with:
+
+    python -m app.dataset compile [--data-path ./data] [--output <file>]
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"ERCOL1\0\0"
+ALIGNMENT = 64
+FORMAT_VERSION = 2
+METADATA_FILE = "company_metadata.json"
+FINANCIALS_FILE = "company_financial_ratios.json"
+DEFAULT_FILENAME = "company_financials.col"
+
+# Non-numeric fields of company_financial_ratios.json; everything else is a float column.
+# Columns whose whole numbers were all JSON integers are flagged "integer" in
+# the header, and records() gives those back as ints.
+_KEY_FIELDS = ("company_id", "fiscal_year")
+_TEXT_FIELDS = ("company_name", "latest_update_date")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _source_signature(data_path: Path) -> Dict[str, List[int]]:
+    """(size, mtime_ns) of each source file, used to detect a stale compile"""
+    signature = {}
+    for name in (METADATA_FILE, FINANCIALS_FILE):
+        st = os.stat(data_path / name)
+        signature[name] = [st.st_size, st.st_mtime_ns]
+    return signature
+
+
+def compile_dataset(data_path: Path, output_path: Path) -> Path:
+    """
+    Compile the JSON dataset into the columnar file format
+
+    Args:
+        data_path: Directory holding company_metadata.json and company_financial_ratios.json
+        output_path: Destination file, written atomically
+
+    Returns:
+        The output path
+    """
+    data_path, output_path = Path(data_path), Path(output_path)
+    try:
+        signature = _source_signature(data_path)
+        raw_metadata = (data_path / METADATA_FILE).read_bytes()
+        raw_financials = (data_path / FINANCIALS_FILE).read_bytes()
+        metadata = json.loads(raw_metadata)
+        records = json.loads(raw_financials)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        raise RuntimeError(f"Failed to load dataset: {str(e)}")
+
+    header, columns = _build_columns(metadata, records)
+    header["source"] = signature
+    header["dataset_version"] = hashlib.sha256(raw_metadata + raw_financials).hexdigest()[:16]
+
+    # Column offsets depend on header length, which depends on the offsets
+    # themselves; fixing the header size first with placeholder offsets keeps it simple.
+    for col in header["columns"]:
+        col["offset"] = 0
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_len = len(header_bytes) + 32 * len(columns)
+    offset = _align(len(MAGIC) + 8 + header_len)
+    for col, array in zip(header["columns"], columns):
+        col["offset"] = offset
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8").ljust(header_len)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, prefix=output_path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", header_len))
+            f.write(header_bytes)
+            for col, array in zip(header["columns"], columns):
+                f.write(b"\0" * (col["offset"] - f.tell()))
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
+
+
+def _build_columns(metadata: List[Dict[str, Any]], records: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    value_fields = sorted({
+        key for item in records for key in item
+        if key not in _KEY_FIELDS and key not in _TEXT_FIELDS
+    })
+
+    company_ids = np.array([int(item["company_id"]) for item in records], dtype="<i8")
+    fiscal_years = np.array([int(item["fiscal_year"]) for item in records], dtype="<i4")
+    order = np.lexsort((fiscal_years, company_ids))
+
+    names = ["company_id", "fiscal_year"] + value_fields
+    columns = [company_ids[order], fiscal_years[order]]
+    integer_fields = set()
+    for field in value_fields:
+        raw = [item.get(field) for item in records]
+        values = np.array([np.nan if value is None else float(value) for value in raw], dtype="<f8")
+        columns.append(values[order])
+        if not any(isinstance(value, float) and value.is_integer() for value in raw):
+            integer_fields.add(field)
+
+    sorted_ids = columns[0]
+    unique_ids, starts, counts = np.unique(sorted_ids, return_index=True, return_counts=True)
+    companies = {
+        str(cid): [int(start), int(start + count)]
+        for cid, start, count in zip(unique_ids, starts, counts)
+    }
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "n_rows": int(len(records)),
+        "columns": [
+            {"name": name, "dtype": col.dtype.str, "integer": name in integer_fields}
+            for name, col in zip(names, columns)
+        ],
+        "companies": companies,
+        "metadata": {str(item["company_id"]): item for item in metadata},
+    }
+    return header, columns
+
+
+class ColumnarDataset:
+    """Read-only, memory-mapped view of a compiled dataset file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise RuntimeError(f"{self.path} is not a compiled dataset file")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+        if header.get("format_version") != FORMAT_VERSION:
+            raise RuntimeError(f"Unsupported dataset format version: {header.get('format_version')}")
+
+        self.header = header
+        self.n_rows: int = header["n_rows"]
+        self.dataset_version: str = header["dataset_version"]
+        self.metadata: Dict[str, Dict[str, Any]] = header["metadata"]
+        self.company_index: Dict[str, Tuple[int, int]] = {
+            cid: (bounds[0], bounds[1]) for cid, bounds in header["companies"].items()
+        }
+        self.columns: Dict[str, np.ndarray] = {
+            col["name"]: np.memmap(self.path, dtype=np.dtype(col["dtype"]), mode="r",
+                                   offset=col["offset"], shape=(self.n_rows,))
+            for col in header["columns"]
+        }
+        self.value_fields = [name for name in self.columns if name not in _KEY_FIELDS]
+        self.integer_fields = {col["name"] for col in header["columns"] if col.get("integer")}
+
+    @classmethod
+    def open(cls, data_path: Path, compiled_path: Optional[Path] = None) -> "ColumnarDataset":
+        """
+        Open the compiled dataset, (re)compiling it first if missing, stale,
+        unreadable or written in another format version
+
+        Args:
+            data_path: Directory with the source JSON files
+            compiled_path: Compiled file location, defaults to data_path/company_financials.col
+        """
+        data_path = Path(data_path)
+        compiled_path = Path(compiled_path) if compiled_path else data_path / DEFAULT_FILENAME
+        if compiled_path.exists():
+            try:
+                dataset = cls(compiled_path)
+            except (RuntimeError, ValueError, KeyError, struct.error) as e:
+                print(f"Recompiling {compiled_path}: {str(e)}")
+            else:
+                if dataset.header.get("source") == _source_signature(data_path):
+                    return dataset
+        try:
+            compile_dataset(data_path, compiled_path)
+        except OSError as e:
+            raise RuntimeError(f"Failed to compile dataset to {compiled_path}: {str(e)}")
+        return cls(compiled_path)
+
+    def company_rows(self, company_id: str) -> slice:
+        """Row range of a company, empty if it has no financial records"""
+        start, end = self.company_index.get(str(company_id), (0, 0))
+        return slice(start, end)
+
+    def recent_rows(self, company_id: str, n_years: int) -> slice:
+        """Row range covering the company's n most recent fiscal years"""
+        rows = self.company_rows(company_id)
+        years = self.columns["fiscal_year"][rows]
+        if len(years) == 0:
+            return rows
+        distinct = np.unique(years)
+        cutoff = distinct[-n_years] if len(distinct) >= n_years else distinct[0]
+        # Years are sorted within the range, so the recent ones form a suffix
+        first = int(np.searchsorted(years, cutoff, side="left"))
+        return slice(rows.start + first, rows.stop)
+
+    def records(self, rows: slice, fields: Iterable[str]) -> List[Dict[str, Any]]:
+        """Materialize rows as dicts of Python scalars, with NaN mapped to None"""
+        fields = list(fields)
+        arrays = [self.columns[field][rows] for field in fields]
+        integer = [field in self.integer_fields for field in fields]
+        out = []
+        for i in range(rows.stop - rows.start):
+            item = {}
+            for field, array, is_integer in zip(fields, arrays, integer):
+                value = array[i].item()
+                if isinstance(value, float):
+                    if value != value:
+                        value = None
+                    elif is_integer and value.is_integer():
+                        value = int(value)
+                item[field] = value
+            out.append(item)
+        return out
+
+
+def main(argv: Optional[List[str]] = None):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="Compile the JSON financial dataset into columnar form")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compile_parser = sub.add_parser("compile", help="compile company_*.json into a memory-mappable file")
+    compile_parser.add_argument("--data-path", help="directory holding the source JSON (default: app.data_path)")
+    compile_parser.add_argument("--output", help=f"output file (default: <data-path>/{DEFAULT_FILENAME})")
+    args = parser.parse_args(argv)
+
+    if args.data_path:
+        data_path = Path(args.data_path)
+    else:
+        from config.config_load import CONFIG
+        data_path = Path(CONFIG["app"]["data_path"])
+    output = Path(args.output) if args.output else data_path / DEFAULT_FILENAME
+
+    path = compile_dataset(data_path, output)
+    dataset = ColumnarDataset(path)
+    print(f"Compiled {dataset.n_rows} rows for {len(dataset.company_index)} companies "
+          f"to {path} (version {dataset.dataset_version})")
+
+
+if __name__ == "__main__":
+    main()
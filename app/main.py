@@ -1,22 +1,73 @@
 # app/main.py
-from fastapi import FastAPI,HTTPException,status, Depends
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI,HTTPException,status, Depends, Request, Response, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from app.jwt_auth import create_access_token
-import markdown
 import uuid
 import os
-from starlette.background import BackgroundTask
-from passlib.context import CryptContext
+import asyncio
+import json
+import base64
+import logging
+from typing import Optional, Literal
 from datetime import datetime, timedelta
-from app.database import get_db_connection
-from app.models import TaskCreate, TaskStatus, Token
-from app.tasks import generate_report_task
+from app.database import fetch_one, fetch_all, run_db, configure_pool, close_pool, get_pool_stats
+from app.models import TaskCreate, TaskStatus, Token, CompanyRatios, TaskBatchCreate, TaskBatchResponse
+from app.tasks import dispatch_report, dispatch_reports_with_prefetch
 from app.data_loader import data_loader
-from app.auth import get_current_user_from_token_or_api_key
+from app.report_cache import report_cache_key, claim_report, claim_reports_batch, INFLIGHT_SECONDS
+from app.auth import get_current_user_from_token_or_api_key, user_cache
+from app.artifacts import ARTIFACT_EXTENSIONS, ensure_artifact, artifact_response, fresh_artifacts
+from app.rendering import render_service, RenderServiceBusy
+from app.report_view import view_page_cache, view_response
+from app.passwords import password_hasher, PasswordServiceBusy
+from app.progress import publish_event, publish_events, stream_events, format_sse, RENDER_WAIT_SECONDS
+from app.tracing import TRACE_GROUPS, load_trace
+from app.metrics import MetricsMiddleware, render_metrics, CONTENT_TYPE_LATEST
 from config.config_load import CONFIG
 
 app = FastAPI(title="Equity Research Report API")
+logger = logging.getLogger(__name__)
+app.add_middleware(MetricsMiddleware)
+
+MAX_BATCH_SIZE = CONFIG["app"].get("MAX_BATCH_SIZE", 5000)
+MAX_PAGE_SIZE = CONFIG["app"].get("MAX_PAGE_SIZE", 500)
+
+@app.on_event("startup")
+async def startup():
+    """Create the API process's database connection pool"""
+    configure_pool(CONFIG["database"].get("pool_size", 10))
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled database connections and render workers"""
+    close_pool()
+    render_service.shutdown()
+
+async def user_backlog(user_id: str) -> int:
+    """
+    Reports of this user still waiting for or in generation (reused runs excluded)
+
+    Like in-flight report reuse, only runs started within the last
+    report_cache.inflight_minutes count: older pending rows are runs whose
+    worker or message was lost, and must not lower the user's priority
+    forever. Only orders dispatch, so a failed lookup counts as no backlog
+    rather than leaving already recorded tasks undispatched.
+    """
+    try:
+        row = await fetch_one(
+            """
+            SELECT COUNT(*) AS backlog FROM tasks
+            WHERE user_id = %s AND status = 'pending' AND source_task_id IS NULL
+              AND created_at >= NOW() - INTERVAL %s SECOND
+            """,
+            (user_id, INFLIGHT_SECONDS)
+        )
+    except Exception:
+        logger.exception("Failed to read report backlog of user %s, dispatching at top priority", user_id)
+        return 0
+    return row["backlog"] if row else 0
 
 # Helper function to validate company ID (placeholder)
 def validate_company_id(company_id: str) -> bool:
@@ -32,7 +83,9 @@ async def create_task(task: TaskCreate, user: dict = Depends(get_current_user_fr
     - company_id: Target company ID from provided dataset
     
     Returns:
-    - Task metadata with initial status
+    - Task metadata with initial status. If an identical report was generated
+      recently the task is already complete; if one is being generated the task
+      follows that run. In both cases source_task_id names the run reused.
     """
     if not task.company_id.isdigit():
         raise HTTPException(400, "company_id must be a numeric string")
@@ -46,63 +99,184 @@ async def create_task(task: TaskCreate, user: dict = Depends(get_current_user_fr
     # Generate unique task ID
     task_id = str(uuid.uuid4())
     
-    # Create database record
-    conn = get_db_connection()
+    # Create database record, reusing a cached or in-flight report when possible
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO tasks 
-                (task_id, company_id, status, user_id)
-                VALUES (%s, %s, %s, %s)
-                """,
-                (task_id, task.company_id, "pending", user["user_id"])
-            )
-        conn.commit()
+        claim = await run_db(
+            claim_report, task_id, task.company_id, user["user_id"], report_cache_key(task.company_id)
+        )
     except Exception as e:
-        conn.rollback()
         raise HTTPException(500, f"Database error: {str(e)}")
-    finally:
-        conn.close()
 
-    # Trigger Celery task
-    generate_report_task.delay(task_id, task.company_id)
+    # Trigger Celery task, behind any reports this user already has waiting
+    if claim["dispatch"]:
+        rank = await user_backlog(user["user_id"]) - 1
+        await asyncio.get_running_loop().run_in_executor(None, publish_event, task_id, "queued")
+        dispatch_report(task_id, task.company_id, rank)
 
+    now = datetime.now()
     return {
         "task_id": task_id,
         "company_id": task.company_id,
-        "status": "pending",
-        "created_at": datetime.now(),
-        "completed_at": None,
-        "report_path": None
+        "status": claim["status"],
+        "created_at": now,
+        "completed_at": now if claim["status"] == "success" else None,
+        "report_path": claim["report_path"],
+        "source_task_id": claim["source_task_id"]
     }
 
 
+@app.post("/tasks/batch", response_model=TaskBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_tasks_batch(batch: TaskBatchCreate, user: dict = Depends(get_current_user_from_token_or_api_key)):
+    """
+    Submit report generation tasks for many companies at once
+
+    Parameters:
+    - company_ids: Target company IDs from provided dataset
+
+    Returns:
+    - Per-company outcome in request order. Invalid IDs are rejected
+      individually; valid ones are recorded in one insert, reuse cached or
+      in-flight reports like POST /tasks, and new runs are dispatched as one
+      Celery group behind a market data prefetch. Each run's priority drops
+      with the user's backlog, so a large batch doesn't delay other users.
+    """
+    if not batch.company_ids:
+        raise HTTPException(400, "company_ids must not be empty")
+
+    if len(batch.company_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"At most {MAX_BATCH_SIZE} company_ids per batch")
+
+    items, accepted = [], []
+    for company_id in batch.company_ids:
+        if not company_id.isdigit():
+            items.append({"company_id": company_id, "status": "rejected", "error": "company_id must be a numeric string"})
+        elif company_id not in data_loader.valid_company_ids:
+            items.append({"company_id": company_id, "status": "rejected", "error": "Invalid company ID. Check company_metadata.json"})
+        else:
+            task_id = str(uuid.uuid4())
+            accepted.append((task_id, company_id))
+            items.append({"company_id": company_id, "task_id": task_id})
+
+    if accepted:
+        try:
+            claims = await run_db(claim_reports_batch, accepted, user["user_id"])
+        except Exception as e:
+            raise HTTPException(500, f"Database error: {str(e)}")
+
+        claims_by_task = {claim["task_id"]: claim for claim in claims}
+        for item in items:
+            claim = claims_by_task.get(item.get("task_id"))
+            if claim:
+                item.update(status=claim["status"], source_task_id=claim["source_task_id"])
+
+        to_run = [(claim["task_id"], claim["company_id"]) for claim in claims if claim["dispatch"]]
+        if to_run:
+            first_rank = await user_backlog(user["user_id"]) - len(to_run)
+            await asyncio.get_running_loop().run_in_executor(
+                None, publish_events, [(task_id, "queued", {}) for task_id, _ in to_run]
+            )
+            dispatch_reports_with_prefetch(to_run, first_rank)
+
+    return {"accepted": len(accepted), "rejected": len(items) - len(accepted), "items": items}
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque keyset cursor for the position after row"""
+    payload = json.dumps([row["created_at"].isoformat(), row["task_id"]])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor; raises HTTP 400 for malformed cursors"""
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(task_id)
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+
 @app.get("/tasks", response_model=list[TaskStatus])
-async def list_tasks(user: dict = Depends(get_current_user_from_token_or_api_key)):
+async def list_tasks(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    task_status: Optional[Literal["pending", "success", "failed"]] = Query(None, alias="status"),
+    company_id: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(get_current_user_from_token_or_api_key)
+):
     """
-    Retrieve all report generation tasks
+    Retrieve report generation tasks, newest first, one page at a time
+    
+    Parameters:
+    - limit: Page size
+    - cursor: Value of the X-Next-Cursor header from the previous page
+    - status, company_id: Optional filters
+    - created_after, created_before: Optional creation time range [after, before)
+    - fields: Optional comma-separated subset of task fields to return
     
     Returns:
-    - List of tasks ordered by creation time
+    - List of tasks ordered by creation time. X-Next-Cursor is set when
+      more tasks follow.
     """
-    conn = get_db_connection()
+    selected = list(TaskStatus.model_fields)
+    if fields:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(selected) - set(TaskStatus.model_fields)
+        if unknown:
+            raise HTTPException(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    # task_id and created_at are always read: they form the keyset
+    columns = ["task_id", "created_at"] + [field for field in selected if field not in ("task_id", "created_at")]
+    conditions, params = ["user_id = %s"], [user["user_id"]]
+    if task_status:
+        conditions.append("status = %s")
+        params.append(task_status)
+    if company_id:
+        conditions.append("company_id = %s")
+        params.append(company_id)
+    if created_after:
+        conditions.append("created_at >= %s")
+        params.append(created_after)
+    if created_before:
+        conditions.append("created_at < %s")
+        params.append(created_before)
+    if cursor:
+        cursor_created_at, cursor_task_id = decode_cursor(cursor)
+        conditions.append("(created_at < %s OR (created_at = %s AND task_id < %s))")
+        params.extend([cursor_created_at, cursor_created_at, cursor_task_id])
+
+    # Deferred join: the page's keys come from an index-only range scan over
+    # a (user_id, [status | company_id], created_at, task_id) index, and only
+    # those rows are then read from the table for the selected columns
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM tasks 
-                WHERE user_id = %s
-                ORDER BY created_at DESC
-                """,
-                (user["user_id"],)
-            )
-            results = cursor.fetchall()
+        results = await fetch_all(
+            f"""
+            SELECT {", ".join(f"t.{column}" for column in columns)} FROM (
+                SELECT task_id FROM tasks
+                WHERE {" AND ".join(conditions)}
+                ORDER BY created_at DESC, task_id DESC
+                LIMIT %s
+            ) page
+            JOIN tasks t ON t.task_id = page.task_id
+            ORDER BY t.created_at DESC, t.task_id DESC
+            """,
+            (*params, limit + 1)
+        )
     except Exception as e:
         raise HTTPException(500, f"Database error: {str(e)}")
-    finally:
-        conn.close()
-    
+
+    headers = {}
+    if len(results) > limit:
+        results = results[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(results[-1])
+
+    if fields:
+        # Sparse rows don't satisfy TaskStatus, so bypass the response model
+        items = [{field: row.get(field) for field in selected} for row in results]
+        return JSONResponse(jsonable_encoder(items), headers=headers)
+
+    response.headers.update(headers)
     return results
 
 @app.get("/tasks/{task_id}", response_model=TaskStatus)
@@ -116,29 +290,216 @@ async def get_task(task_id: str, user: dict = Depends(get_current_user_from_toke
     Returns:
     - Full task metadata including final report path
     """
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM tasks 
-                WHERE task_id = %s AND user_id = %s
-                """,
-                (task_id, user["user_id"])
-            )
-            result = cursor.fetchone()
+        result = await fetch_one(
+            """
+            SELECT * FROM tasks 
+            WHERE task_id = %s AND user_id = %s
+            """,
+            (task_id, user["user_id"])
+        )
     except Exception as e:
         raise HTTPException(500, f"Database error: {str(e)}")
-    finally:
-        conn.close()
     
     if not result:
         raise HTTPException(404, "Task not found")
     
     return result
 
+@app.get("/tasks/{task_id}/events")
+async def task_events(task_id: str, request: Request, user: dict = Depends(get_current_user_from_token_or_api_key)):
+    """
+    Stream a task's progress as Server-Sent Events
+
+    Parameters:
+    - task_id: UUID of the task
+
+    Returns:
+    - text/event-stream that starts with the task's current status, replays
+      the run's events so far, then pushes new ones (queued, running,
+      llm_turn, tool_start, tool_end, writing_report, success, rendering)
+      until rendered or failed. success carries rendering: true while the
+      HTML/PDF are being rendered; rendered lists the formats that are ready.
+      Tasks that reuse another run follow that run's events.
+    - report_delta events carry the report text as it is generated:
+      {turn, offset, text}. Concatenate the deltas of the latest turn; the
+      last turn is the report.
+    """
+    # Seconds since completion come from the database clock, like completed_at
+    status_columns = """
+        status, error_message, report_path,
+        TIMESTAMPDIFF(SECOND, completed_at, NOW()) AS completed_seconds_ago
+    """
+    try:
+        task = await fetch_one(
+            f"""
+            SELECT task_id, source_task_id, {status_columns} FROM tasks 
+            WHERE task_id = %s AND user_id = %s
+            """,
+            (task_id, user["user_id"])
+        )
+    except Exception as e:
+        raise HTTPException(500, f"Database error: {str(e)}")
+
+    if not task:
+        raise HTTPException(404, "Task not found")
+
+    try:
+        last_seq = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        last_seq = 0
+
+    def awaiting_artifacts(row: dict) -> bool:
+        # A finished report whose HTML/PDF may still be rendering
+        return (row["status"] == "success" and row["report_path"] is not None
+                and (row["completed_seconds_ago"] or 0) < RENDER_WAIT_SECONDS
+                and len(fresh_artifacts(row["report_path"])) < len(ARTIFACT_EXTENSIONS))
+
+    async def check_status():
+        # Fallback for runs whose worker died before publishing an outcome,
+        # or whose render task never reported back
+        try:
+            row = await fetch_one(f"SELECT {status_columns} FROM tasks WHERE task_id = %s", (task_id,))
+        except Exception:
+            return None
+        if not row or row["status"] == "pending" or awaiting_artifacts(row):
+            return None
+        if row["status"] == "success":
+            return {"event": "rendered", "formats": fresh_artifacts(row["report_path"])}
+        return {"event": row["status"], "error": row["error_message"]}
+
+    async def event_stream():
+        yield format_sse({"event": "status", "task_id": task["task_id"], "status": task["status"],
+                          "source_task_id": task["source_task_id"]})
+        if task["status"] != "pending" and not awaiting_artifacts(task):
+            return
+        run_id = task["source_task_id"] or task_id
+        async for payload in stream_events(run_id, last_seq, request.is_disconnected, check_status):
+            yield ": keep-alive\n\n" if payload is None else format_sse(payload)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/tasks/{task_id}/trace")
+async def get_task_trace(task_id: str, user: dict = Depends(get_current_user_from_token_or_api_key)):
+    """
+    Get the execution trace of the agent run behind a task
+
+    Parameters:
+    - task_id: UUID of the task
+
+    Returns:
+    - Run summary (wall_seconds, llm_turns, tool_calls, token counts,
+      tool_payload_chars) plus every model turn with its latency and token
+      usage and every tool call with its arguments, latency and payload
+      size. Tasks that reuse another run return that run's trace.
+    """
+    try:
+        row = await fetch_one(
+            """
+            SELECT t.task_id AS requested_task_id, tr.* FROM tasks t
+            LEFT JOIN task_traces tr ON tr.task_id = COALESCE(t.source_task_id, t.task_id)
+            WHERE t.task_id = %s AND t.user_id = %s
+            """,
+            (task_id, user["user_id"])
+        )
+    except Exception as e:
+        raise HTTPException(500, f"Database error: {str(e)}")
+
+    if not row:
+        raise HTTPException(404, "Task not found")
+    if row["trace"] is None:
+        raise HTTPException(404, "Trace not available")
+
+    return await asyncio.get_running_loop().run_in_executor(None, load_trace, row)
+
+@app.get("/traces/stats")
+async def trace_stats(
+    group_by: Literal["day", "model", "prompt_version", "agent_mode", "company_id"] = "day",
+    company_id: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    user: dict = Depends(get_current_user_from_token_or_api_key)
+):
+    """
+    Aggregate the traces of the user's agent runs
+
+    Parameters:
+    - group_by: day, model, prompt_version, agent_mode (pipeline or tools,
+      with or without tool payload compaction) or company_id
+    - company_id: Optional filter
+    - created_after, created_before: Optional run time range [after, before)
+
+    Returns:
+    - One row per group: run count, failures, wall time, model turns,
+      token usage and tool payload size
+    """
+    group = TRACE_GROUPS[group_by]
+    conditions, params = ["t.user_id = %s"], [user["user_id"]]
+    if company_id:
+        conditions.append("tr.company_id = %s")
+        params.append(company_id)
+    if created_after:
+        conditions.append("tr.created_at >= %s")
+        params.append(created_after)
+    if created_before:
+        conditions.append("tr.created_at < %s")
+        params.append(created_before)
+
+    try:
+        return await fetch_all(
+            f"""
+            SELECT {group} AS `group`,
+                   COUNT(*) AS runs,
+                   SUM(tr.status = 'failed') AS failed,
+                   AVG(tr.wall_seconds) AS avg_wall_seconds,
+                   MAX(tr.wall_seconds) AS max_wall_seconds,
+                   AVG(tr.llm_turns) AS avg_llm_turns,
+                   AVG(tr.tool_calls) AS avg_tool_calls,
+                   AVG(tr.input_tokens) AS avg_input_tokens,
+                   AVG(tr.output_tokens) AS avg_output_tokens,
+                   AVG(tr.cached_tokens) AS avg_cached_tokens,
+                   SUM(tr.input_tokens + tr.output_tokens) AS total_tokens,
+                   AVG(tr.tool_payload_chars) AS avg_tool_payload_chars
+            FROM task_traces tr
+            JOIN tasks t ON t.task_id = tr.task_id
+            WHERE {" AND ".join(conditions)}
+            GROUP BY `group`
+            ORDER BY `group`
+            """,
+            tuple(params)
+        )
+    except Exception as e:
+        raise HTTPException(500, f"Database error: {str(e)}")
+
+@app.get("/companies/{company_id}/ratios", response_model=CompanyRatios)
+async def get_company_ratios(company_id: str, years: int = 5, user: dict = Depends(get_current_user_from_token_or_api_key)):
+    """
+    Get financial ratios and growth rates for a company
+
+    Parameters:
+    - company_id: Target company ID from provided dataset
+    - years: Number of most recent fiscal years (1-30)
+
+    Returns:
+    - ROE, ROA, debt/equity, current ratio, net margin, YoY growth and CAGR per fiscal year
+    """
+    if not 1 <= years <= 30:
+        raise HTTPException(400, "years must be between 1 and 30")
+
+    if not validate_company_id(company_id):
+        raise HTTPException(404, "Company not found")
+
+    # numpy work over the dataset; keep it off the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, data_loader.get_company_ratios, company_id, years
+    )
+
 @app.get("/reports/{task_id}/view", response_class=HTMLResponse)
-async def view_report(task_id: str, user: dict = Depends(get_current_user_from_token_or_api_key)):
+async def view_report(task_id: str, request: Request, user: dict = Depends(get_current_user_from_token_or_api_key)):
     """
     View the generated report in HTML format
     
@@ -146,23 +507,19 @@ async def view_report(task_id: str, user: dict = Depends(get_current_user_from_t
     - task_id: UUID of the task
     
     Returns:
-    - HTML page with the report content
+    - HTML page with the report content, gzip/brotli-compressed when
+      accepted, with an ETag for conditional requests (304)
     """
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT report_path, status FROM tasks 
-                WHERE task_id = %s AND user_id = %s
-                """,
-                (task_id, user["user_id"])
-            )
-            result = cursor.fetchone()
+        result = await fetch_one(
+            """
+            SELECT report_path, status FROM tasks 
+            WHERE task_id = %s AND user_id = %s
+            """,
+            (task_id, user["user_id"])
+        )
     except Exception as e:
         raise HTTPException(500, f"Database error: {str(e)}")
-    finally:
-        conn.close()
     
     if not result:
         raise HTTPException(404, "Task not found")
@@ -175,45 +532,16 @@ async def view_report(task_id: str, user: dict = Depends(get_current_user_from_t
     if not report_path or not os.path.exists(report_path):
         raise HTTPException(404, "Report file not found")
     
-    # Read markdown content
-    with open(report_path, 'r') as f:
-        md_content = f.read()
-    
-    # Convert markdown to HTML
-    html_content = markdown.markdown(md_content, extensions=['tables', 'fenced_code'])
-    
-    # Add styling
-    styled_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>Equity Research Report</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
-            h1 {{ color: #333366; }}
-            h2 {{ color: #333366; border-bottom: 1px solid #cccccc; padding-bottom: 5px; }}
-            table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-            .container {{ max-width: 1000px; margin: 0 auto; }}
-            .download-link {{ display: inline-block; margin-top: 20px; padding: 10px 15px;
-                           background-color: #4CAF50; color: white; text-decoration: none;
-                           border-radius: 4px; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            {html_content}
-            <a href="/reports/{task_id}" class="download-link">Download PDF</a>
-        </div>
-    </body>
-    </html>
-    """
-    return styled_html
+    # Page is cached per task, compressed, and rebuilt only when the report changes
+    try:
+        page = await view_page_cache.get(task_id, report_path)
+    except Exception as e:
+        raise HTTPException(500, f"Error rendering report: {str(e)}")
+
+    return view_response(request, page)
 
 @app.get("/reports/{task_id}")
-async def download_report(task_id: str, user: dict = Depends(get_current_user_from_token_or_api_key)):
+async def download_report(task_id: str, request: Request, user: dict = Depends(get_current_user_from_token_or_api_key)):
     """
     Download the generated report for a specific task
     
@@ -221,23 +549,19 @@ async def download_report(task_id: str, user: dict = Depends(get_current_user_fr
     - task_id: UUID of the task
     
     Returns:
-    - PDF file download
+    - PDF file download. Supports If-None-Match / If-Modified-Since (304)
+      and single byte ranges (206).
     """
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT company_id, report_path, status FROM tasks 
-                WHERE task_id = %s AND user_id = %s
-                """,
-                (task_id, user["user_id"])
-            )
-            result = cursor.fetchone()
+        result = await fetch_one(
+            """
+            SELECT company_id, report_path, status FROM tasks 
+            WHERE task_id = %s AND user_id = %s
+            """,
+            (task_id, user["user_id"])
+        )
     except Exception as e:
         raise HTTPException(500, f"Database error: {str(e)}")
-    finally:
-        conn.close()
     
     if not result:
         raise HTTPException(404, "Task not found")
@@ -250,25 +574,24 @@ async def download_report(task_id: str, user: dict = Depends(get_current_user_fr
     if not report_path or not os.path.exists(report_path):
         raise HTTPException(404, "Report file not found")
     
+    # Normally rendered when the task completed; render now (once) if missing
     try:
-        pdf_path = report_path.replace('.md', '.pdf')
-        from app.utils import markdown_to_pdf
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-        # Convert to PDF
-        markdown_to_pdf(report_path, pdf_path)
-        return FileResponse(
-            path=pdf_path,
-            media_type="application/pdf",
-            filename=f"report_{result.get('company_id')}.pdf",
-            background=BackgroundTask(lambda: os.remove(pdf_path) if os.path.exists(pdf_path) else None)
+        pdf_path = await ensure_artifact(report_path, "pdf")
+    except RenderServiceBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF rendering is busy, please retry shortly",
+            headers={"Retry-After": "5"},
         )
     except Exception as e:
         raise HTTPException(500, f"Error converting to PDF: {str(e)}")
-    # finally:
-    #     # Clean up the temporary PDF file
-    #     if os.path.exists(pdf_path):
-    #         os.remove(pdf_path)
+
+    return artifact_response(
+        request,
+        pdf_path,
+        media_type="application/pdf",
+        filename=f"report_{result.get('company_id')}.pdf"
+    )
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
@@ -289,23 +612,17 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     """
     username = form_data.username
     password = form_data.password
-    conn = get_db_connection()
     user = None
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT user_id, username, password_hash FROM users
-                WHERE username = %s
-                """,
-                (username,)
-            )
-            user = cursor.fetchone()
+        user = await fetch_one(
+            """
+            SELECT user_id, username, password_hash FROM users
+            WHERE username = %s
+            """,
+            (username,)
+        )
     except Exception as e:
-        conn.close()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}")
-    finally:
-        conn.close()
     
     if not user:
         raise HTTPException(
@@ -314,7 +631,16 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if not CryptContext(schemes=["bcrypt"], deprecated="auto").verify(password, user["password_hash"]):
+    try:
+        password_ok = await password_hasher.verify(password, user["password_hash"])
+    except PasswordServiceBusy:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent login attempts, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -329,4 +655,30 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             },
         expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for the API, plus every worker process sharing the metrics directory"""
+    body = await asyncio.get_running_loop().run_in_executor(None, render_metrics)
+    return Response(content=body, media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/health")
+async def health():
+    """
+    Liveness check including database reachability and connection pool, auth cache, password hashing, PDF rendering and view cache metrics
+    """
+    try:
+        await fetch_one("SELECT 1 AS ok")
+        db_status = "ok"
+    except Exception as e:
+        db_status = f"error: {str(e)}"
+    return {
+        "status": "ok" if db_status == "ok" else "degraded",
+        "database": db_status,
+        "db_pool": get_pool_stats(),
+        "auth_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "pdf_renderer": render_service.stats(),
+        "view_cache": view_page_cache.stats()
+    }
\ No newline at end of file
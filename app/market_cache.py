@@ -0,0 +1,388 @@
+# app/market_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from config.config_load import CONFIG
+
+# Data kind -> default TTL in seconds. Quotes move constantly, annual
+# statements only change a few times a year.
+DEFAULT_TTLS = {
+    "info": 300,
+    "history": 3600,
+    "financials": 3 * 86400,
+    "balance_sheet": 3 * 86400,
+    "cashflow": 3 * 86400,
+}
+
+
+class CacheBackend(ABC):
+    """Minimal key/value store with expiry and a best-effort distributed lock"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    @abstractmethod
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """Return a token if the lock was taken, None if someone else holds it"""
+
+    @abstractmethod
+    def release_lock(self, key: str, token: str):
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Process-local backend: nothing shared between workers"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._locks: Dict[str, tuple] = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._mutex:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.time():
+                self._data.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._mutex:
+            self._data[key] = (time.time() + ttl, value)
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        with self._mutex:
+            held = self._locks.get(key)
+            if held is not None and held[0] > time.time():
+                return None
+            token = uuid.uuid4().hex
+            self._locks[key] = (time.time() + ttl, token)
+            return token
+
+    def release_lock(self, key: str, token: str):
+        with self._mutex:
+            if self._locks.get(key, (0, None))[1] == token:
+                del self._locks[key]
+
+
+def canned_market_data(kind: str, key: str) -> Any:
+    """
+    Deterministic stand-in for a Yahoo Finance result, shaped like the tool's
+
+    Args:
+        kind: Data kind (info, history, financials, balance_sheet, cashflow)
+        key: Ticker, or "ticker:period" for history
+
+    Returns:
+        The value the Yahoo Finance tool would have cached for (kind, key)
+    """
+    ticker, _, period = key.partition(":")
+    seed = sum(ord(c) for c in ticker)
+    scale = 1e8 * (1 + seed % 50)
+    if kind == "info":
+        price = 20.0 + seed % 180
+        return {"symbol": ticker, "shortName": f"{ticker} Corp", "industry": "Industrials",
+                "sector": "Industrials", "currentPrice": price, "previousClose": round(price * 0.99, 2),
+                "marketCap": int(price * 1e9), "trailingPE": 15.0, "forwardPE": 13.0, "recommendationMean": 2.1}
+    if kind == "history":
+        count = int(period[:-1]) if period[:-1].isdigit() else 1
+        days = 365 * count if period.endswith("y") else 30 * count
+        end = date.today()
+        dates = [end - timedelta(days=offset) for offset in range(days, -1, -1)]
+        dates = [day for day in dates if day.weekday() < 5]
+        # Same draws for a ticker every time: a smooth walk around its base price
+        close, records = 20.0 + seed % 180, []
+        for i, day in enumerate(dates):
+            close *= 1 + 0.01 * (((seed * 7919 + i * 104729) % 201) / 100 - 1)
+            records.append({"Date": day.isoformat(), "Close": round(close, 4),
+                            "Volume": 1_000_000 + (seed * 31 + i * 7) % 4_000_000})
+        return records
+    if kind == "financials":
+        return {"totalRevenue": 10.0 * scale, "netIncome": 0.8 * scale, "grossProfit": 3.5 * scale}
+    if kind == "balance_sheet":
+        return {"totalAssets": 20.0 * scale, "totalLiabilities": 12.0 * scale, "commonStockEquity": 8.0 * scale}
+    if kind == "cashflow":
+        return {"operatingCashFlow": 1.5 * scale, "freeCashFlow": 0.9 * scale}
+    return None
+
+
+class StubCacheBackend(MemoryCacheBackend):
+    """
+    Offline backend: every read is a hit, so Yahoo Finance is never called
+
+    Serves entries from a JSON fixture file ({"info:AAPL": {...},
+    "history:AAPL:1y": [...], ...}) when one is given, and canned_market_data
+    for any other key. Values stored with set() take precedence, per process.
+    """
+
+    offline = True
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.fixtures: Dict[str, Any] = {}
+        if path:
+            with open(path, encoding="utf-8") as f:
+                self.fixtures = json.load(f)
+
+    def get(self, key: str) -> Optional[bytes]:
+        stored = super().get(key)
+        if stored is not None:
+            return stored
+        kind, _, rest = key.partition(":")
+        value = self.fixtures[key] if key in self.fixtures else canned_market_data(kind, rest)
+        return json.dumps(value).encode("utf-8") if value is not None else None
+
+
+class FileCacheBackend(CacheBackend):
+    """On-disk backend shared by all worker processes on one host"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, key: str, suffix: str) -> Path:
+        return self.path / (hashlib.sha1(key.encode("utf-8")).hexdigest() + suffix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            raw = self._file(key, ".json").read_bytes()
+        except FileNotFoundError:
+            return None
+        expires_at, _, value = raw.partition(b"\n")
+        if float(expires_at) <= time.time():
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        target = self._file(key, ".json")
+        tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(str(time.time() + ttl).encode("ascii") + b"\n" + value)
+        os.replace(tmp, target)
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        lock_file = self._file(key, ".lock")
+        token = uuid.uuid4().hex
+        for _ in range(2):
+            try:
+                fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # Break locks left behind by a crashed holder
+                try:
+                    if time.time() - lock_file.stat().st_mtime > ttl:
+                        lock_file.unlink()
+                        continue
+                except FileNotFoundError:
+                    continue
+                return None
+            with os.fdopen(fd, "w") as f:
+                f.write(token)
+            return token
+        return None
+
+    def release_lock(self, key: str, token: str):
+        lock_file = self._file(key, ".lock")
+        try:
+            if lock_file.read_text() == token:
+                lock_file.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis backend shared by every API and worker process"""
+
+    # Delete the lock only if we still own it
+    _RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, prefix: str = "market:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._release = self.client.register_script(self._RELEASE_SCRIPT)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if self.client.set(self.prefix + "lock:" + key, token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    def release_lock(self, key: str, token: str):
+        self._release(keys=[self.prefix + "lock:" + key], args=[token])
+
+
+class MarketDataCache:
+    """
+    TTL-tiered cache for market data with single-flight fetching
+
+    Only one caller across all processes sharing the backend fetches a given
+    key at a time; the others wait for its result instead of issuing the same
+    Yahoo Finance request.
+    """
+
+    def __init__(self, backend: CacheBackend, ttls: Optional[Dict[str, float]] = None,
+                 lock_timeout: float = 15.0, poll_interval: float = 0.1):
+        self.backend = backend
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._counter_lock = threading.Lock()
+
+    def get_or_fetch(self, kind: str, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for (kind, key), calling fetch() on a miss
+
+        Args:
+            kind: Data kind, selects the TTL (info, history, financials, ...)
+            key: Identifies the request within the kind, e.g. the ticker
+            fetch: Zero-argument callable returning a JSON-serializable value
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        cache_key = f"{kind}:{key}"
+        cached = self._get(cache_key)
+        if cached is not None:
+            self._count("hits")
+            return cached
+
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            token = self._acquire(cache_key)
+            if token is not None:
+                try:
+                    # Another holder may have filled the cache while we waited
+                    cached = self._get(cache_key)
+                    if cached is not None:
+                        self._count("coalesced")
+                        return cached
+                    self._count("misses")
+                    value = fetch()
+                    self._set(cache_key, value, self.ttls.get(kind, 300))
+                    return value
+                finally:
+                    self._release(cache_key, token)
+
+            time.sleep(self.poll_interval)
+            cached = self._get(cache_key)
+            if cached is not None:
+                self._count("coalesced")
+                return cached
+            if time.monotonic() >= deadline:
+                # The holder is stuck or gone; don't wait on it forever
+                self._count("misses")
+                return fetch()
+
+    def put(self, kind: str, key: str, value: Any):
+        """Store a value fetched elsewhere, e.g. by a bulk prefetch"""
+        self._set(f"{kind}:{key}", value, self.ttls.get(kind, 300))
+
+    @property
+    def offline(self) -> bool:
+        """True when the backend serves every key itself and Yahoo Finance must not be called"""
+        return getattr(self.backend, "offline", False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            return {"backend": type(self.backend).__name__, **self._counters}
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    # Backend failures degrade to "no cache" rather than failing the tool call
+    def _get(self, key: str) -> Any:
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            self._count("errors")
+            print(f"Market cache read failed for {key}: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def _set(self, key: str, value: Any, ttl: float):
+        try:
+            self.backend.set(key, json.dumps(value, default=str).encode("utf-8"), ttl)
+        except Exception as e:
+            self._count("errors")
+            print(f"Market cache write failed for {key}: {e}")
+
+    def _acquire(self, key: str) -> Optional[str]:
+        try:
+            return self.backend.acquire_lock(key, self.lock_timeout)
+        except Exception:
+            self._count("errors")
+            return "unlocked"
+
+    def _release(self, key: str, token: str):
+        if token == "unlocked":
+            return
+        try:
+            self.backend.release_lock(key, token)
+        except Exception:
+            self._count("errors")
+
+
+def build_market_cache(settings: Optional[Dict[str, Any]] = None) -> MarketDataCache:
+    """
+    Create a MarketDataCache from the [market_cache] config section
+
+    backend = "redis" (default, uses [redis].url unless url is set),
+    "file" (path, default ./cache/market), "memory" (in-process only) or
+    "stub" (offline: canned data, or the JSON fixture file at path).
+    """
+    settings = CONFIG.get("market_cache", {}) if settings is None else settings
+    backend_name = settings.get("backend", "redis")
+    if backend_name == "redis":
+        backend = RedisCacheBackend(settings.get("url", CONFIG["redis"]["url"]))
+    elif backend_name == "file":
+        backend = FileCacheBackend(settings.get("path", "./cache/market"))
+    elif backend_name == "memory":
+        backend = MemoryCacheBackend()
+    elif backend_name == "stub":
+        backend = StubCacheBackend(settings.get("path"))
+    else:
+        raise RuntimeError(f"Unknown market_cache backend: {backend_name}")
+
+    ttls = {kind: settings[f"ttl_{kind}"] for kind in DEFAULT_TTLS if f"ttl_{kind}" in settings}
+    # Waiting longer than the owner's own fetch timeout only delays the fallback fetch
+    fetch_timeout = CONFIG.get("yahoo_finance", {}).get("timeout", 15)
+    lock_timeout = min(settings.get("lock_timeout", fetch_timeout), fetch_timeout)
+    return MarketDataCache(backend, ttls=ttls, lock_timeout=lock_timeout)
+
+
+_market_cache: Optional[MarketDataCache] = None
+_market_cache_lock = threading.Lock()
+
+
+def get_market_cache() -> MarketDataCache:
+    """Process-wide market data cache, built lazily from config"""
+    global _market_cache
+    if _market_cache is None:
+        with _market_cache_lock:
+            if _market_cache is None:
+                _market_cache = build_market_cache()
+    return _market_cache
@@ -0,0 +1,162 @@
+# app/metrics.py
+import os
+import time
+from typing import Optional
+from config.config_load import CONFIG
+
+METRICS_CONFIG = CONFIG.get("metrics", {})
+
+# Celery prefork children and the PDF render pool are separate processes.
+# With a shared directory every process writes its samples there and
+# /metrics aggregates them. Must be set before prometheus_client is imported.
+if METRICS_CONFIG.get("multiproc_dir"):
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_CONFIG["multiproc_dir"])
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily  # noqa: E402
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# Buckets for calls that take milliseconds (DB, cache) and ones that take minutes (agent runs)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency", ["method", "route", "status"], buckets=FAST_BUCKETS
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled MySQL connection", buckets=FAST_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Time to run a database operation, including pool wait", ["operation"], buckets=FAST_BUCKETS
+)
+AUTH_CACHE_LOOKUPS = Counter(
+    "auth_cache_lookups_total", "User cache lookups by result", ["result"]
+)
+TASK_WAIT_SECONDS = Histogram(
+    "celery_task_wait_seconds", "Time a Celery task spent queued before a worker started it", ["task"],
+    buckets=SLOW_BUCKETS
+)
+TASK_SECONDS = Histogram(
+    "celery_task_duration_seconds", "Celery task run time", ["task", "state"], buckets=SLOW_BUCKETS
+)
+AGENT_SECONDS = Histogram(
+    "agent_run_seconds", "Wall time of one agent run", ["outcome"], buckets=SLOW_BUCKETS
+)
+LLM_TURNS = Histogram(
+    "agent_llm_turns_per_run", "Model calls per agent run", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30)
+)
+LLM_TOKENS = Histogram(
+    "agent_llm_tokens_per_run", "Tokens per agent run", ["kind"],
+    buckets=(1000, 2500, 5000, 10000, 20000, 40000, 80000, 160000, 320000)
+)
+LLM_TOKENS_TOTAL = Counter(
+    "agent_llm_tokens_total", "Tokens used by agent runs", ["kind"]
+)
+TOOL_SECONDS = Histogram(
+    "agent_tool_seconds", "Agent tool call latency", ["tool", "outcome"], buckets=FAST_BUCKETS
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "anthropic_rate_limit_wait_seconds", "Time a model call waited for the shared rate limiter", buckets=SLOW_BUCKETS
+)
+RATE_LIMIT_ERRORS = Counter(
+    "anthropic_rate_limit_errors_total", "Rate-limited (429) and overloaded (529) Anthropic responses", ["status"]
+)
+REPORT_WRITE_SECONDS = Histogram(
+    "report_write_seconds", "Time to write a finished report to disk", buckets=FAST_BUCKETS
+)
+RENDER_SECONDS = Histogram(
+    "report_render_seconds", "Time to render a report artifact", ["format"], buckets=SLOW_BUCKETS
+)
+
+
+class QueueDepthCollector:
+    """Celery queue lengths, read from the Redis broker at scrape time, summed over priority levels"""
+
+    def __init__(self, queues):
+        self.queues = list(queues)
+        self._client = None
+
+    def describe(self):
+        # Keeps registration from reaching Redis
+        yield GaugeMetricFamily("celery_queue_length", "Messages waiting in a Celery queue", labels=["queue"])
+
+    def collect(self):
+        family = GaugeMetricFamily("celery_queue_length", "Messages waiting in a Celery queue", labels=["queue"])
+        try:
+            if self._client is None:
+                import redis
+                self._client = redis.Redis.from_url(CONFIG["redis"]["url"], socket_timeout=1)
+            from config.celery_config import PRIORITY_STEPS, PRIORITY_SEP
+            pipe = self._client.pipeline(transaction=False)
+            for queue in self.queues:
+                for step in PRIORITY_STEPS:
+                    pipe.llen(f"{queue}{PRIORITY_SEP}{step}" if step else queue)
+            lengths = pipe.execute()
+            for i, queue in enumerate(self.queues):
+                steps = len(PRIORITY_STEPS)
+                family.add_metric([queue], sum(lengths[i * steps:(i + 1) * steps]))
+        except Exception as e:
+            print(f"Failed to read Celery queue lengths: {str(e)}")
+        yield family
+
+
+def build_registry() -> CollectorRegistry:
+    """Registry exposed by /metrics: this process, or every process sharing the multiprocess dir"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return registry
+
+
+_scrape_registry: Optional[CollectorRegistry] = None
+
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition of all metrics plus Celery queue depth"""
+    global _scrape_registry
+    if _scrape_registry is None:
+        _scrape_registry = build_registry()
+        _scrape_registry.register(QueueDepthCollector(METRICS_CONFIG.get("queues", ["reports", "render", "prefetch"])))
+    return generate_latest(_scrape_registry)
+
+
+def mark_process_dead(pid: int):
+    """Drop a finished process's live gauges from the multiprocess dir"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request, labelled by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Templates, not raw paths, keep label cardinality bounded
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, str(status["code"])).observe(
+                time.perf_counter() - started
+            )
+
@@ -1,6 +1,6 @@
 # app/models.py
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 # Request/Response Models
@@ -14,6 +14,47 @@ class TaskStatus(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime]
     report_path: Optional[str]
+    source_task_id: Optional[str] = None
+
+class TaskBatchCreate(BaseModel):
+    company_ids: List[str]
+
+class TaskBatchItem(BaseModel):
+    """Outcome for one company_id of a batch submission"""
+    company_id: str
+    task_id: Optional[str] = None
+    status: str
+    source_task_id: Optional[str] = None
+    error: Optional[str] = None
+
+class TaskBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    items: List[TaskBatchItem]
+
+class FinancialRatios(BaseModel):
+    """Ratios and growth rates for one fiscal year"""
+    fiscal_year: int
+    roe: Optional[float] = None
+    roa: Optional[float] = None
+    debt_to_equity: Optional[float] = None
+    current_ratio: Optional[float] = None
+    net_margin: Optional[float] = None
+    total_revenue_yoy: Optional[float] = None
+    net_income_yoy: Optional[float] = None
+    shareholders_equity_yoy: Optional[float] = None
+    total_asset_yoy: Optional[float] = None
+    total_revenue_cagr_3y: Optional[float] = None
+    net_income_cagr_3y: Optional[float] = None
+    total_revenue_cagr_5y: Optional[float] = None
+    net_income_cagr_5y: Optional[float] = None
+
+class CompanyRatios(BaseModel):
+    """Financial ratios for a company across recent fiscal years"""
+    company_id: str
+    company_name: Optional[str]
+    dataset_version: str
+    ratios: List[FinancialRatios]
 
 class Token(BaseModel):
     """Token response model"""
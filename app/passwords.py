@@ -0,0 +1,75 @@
+# app/passwords.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from passlib.context import CryptContext
+from config.config_load import CONFIG
+
+# One context for the whole process; building it per call re-parses the scheme config
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when the hashing pool already has max_queue requests waiting"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hash/verify on a small dedicated thread pool
+
+    bcrypt releases the GIL while hashing, so a thread pool keeps the event
+    loop free without the cost of a process pool. Admission is bounded: once
+    max_workers + max_queue calls are in flight, new calls fail fast with
+    PasswordServiceBusy instead of queueing behind a login burst.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 16, context: CryptContext = pwd_context):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.context = context
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"completed": 0, "rejected": 0}
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """Check a password against a stored hash without blocking the event loop"""
+        return await self._submit(self.context.verify, password, password_hash)
+
+    async def hash(self, password: str) -> str:
+        """Hash a password without blocking the event loop"""
+        return await self._submit(self.context.hash, password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth and counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                **self._counters,
+            }
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise PasswordServiceBusy("Password verification queue is full")
+            self._in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+            executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._counters["completed"] += 1
+
+
+password_hasher = PasswordHasher(
+    max_workers=CONFIG["app"].get("PASSWORD_HASH_WORKERS", 2),
+    max_queue=CONFIG["app"].get("PASSWORD_HASH_QUEUE", 16)
+)
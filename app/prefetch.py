@@ -0,0 +1,95 @@
+# app/prefetch.py
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Any
+import yfinance as yf
+from app.data_loader import data_loader
+from app.market_cache import get_market_cache
+from app.agents.tools.yahoo_finance_tool import YahooFinanceTool
+from config.config_load import CONFIG
+
+PREFETCH_CONFIG = CONFIG.get("prefetch", {})
+
+
+def resolve_tickers(company_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    Map company IDs to the ticker symbols the agent will query
+
+    Uses the same normalization as DataLoader.get_company_data ("AAL US" -> "AAL").
+    Companies without a ticker are left out.
+    """
+    tickers = {}
+    for company_id in company_ids:
+        ticker = data_loader.company_metadata.get(str(company_id), {}).get("ticker")
+        if isinstance(ticker, str) and ticker.strip():
+            tickers[str(company_id)] = ticker.split(" ")[0]
+    return tickers
+
+
+def _bulk_history(tickers: List[str], period: str) -> Dict[str, list]:
+    """Download price history for all tickers in one request"""
+    start_date, end_date, max_history_points = YahooFinanceTool.history_window(period)
+    frame = yf.download(
+        tickers, start=start_date, end=end_date, group_by="ticker",
+        auto_adjust=True, progress=False, threads=True
+    )
+    histories = {}
+    for ticker in tickers:
+        if frame is None or frame.empty:
+            break
+        if ticker in frame.columns.get_level_values(0):
+            histories[ticker] = YahooFinanceTool.history_records(frame[ticker], max_history_points)
+    return histories
+
+
+def prefetch_market_data(company_ids: Iterable[str], period: str = "1y",
+                         max_concurrency: int = None) -> Dict[str, Any]:
+    """
+    Warm the market data cache for a batch of companies
+
+    Price history for every ticker comes from one bulk download; info and
+    statements go through the cache's single-flight path with bounded
+    concurrency, so tickers cached recently cost nothing.
+
+    Args:
+        company_ids: Companies about to be reported on
+        period: History period the agent will request (the tool's default is 1y)
+        max_concurrency: Parallel statement/info fetches, defaults to prefetch.max_concurrency
+
+    Returns:
+        Summary with the tickers warmed and any per-ticker failures
+    """
+    max_concurrency = max_concurrency or PREFETCH_CONFIG.get("max_concurrency", 4)
+    tickers = sorted(set(resolve_tickers(company_ids).values()))
+    if not tickers:
+        return {"tickers": [], "failed": {}}
+
+    cache = get_market_cache()
+    failed: Dict[str, str] = {}
+    if cache.offline:
+        return {"tickers": tickers, "failed": failed}
+
+    try:
+        histories = _bulk_history(tickers, period)
+    except Exception as e:
+        print(f"Bulk history download failed: {e}")
+        histories = {}
+    for ticker, records in histories.items():
+        if records:
+            cache.put("history", f"{ticker}:{period}", records)
+
+    tool = YahooFinanceTool()
+
+    def warm(ticker: str):
+        jobs = tool._fetch_jobs(ticker, period)
+        if histories.get(ticker):
+            jobs.pop("historical_data")
+        for section, job in jobs.items():
+            try:
+                job()
+            except Exception as e:
+                failed[f"{ticker}:{section}"] = str(e)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="prefetch") as executor:
+        list(executor.map(warm, tickers))
+
+    return {"tickers": tickers, "failed": failed}
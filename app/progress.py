@@ -0,0 +1,285 @@
+# app/progress.py
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from config.config_load import CONFIG
+
+PROGRESS_CONFIG = CONFIG.get("progress", {})
+# Events are kept this long so clients that connect late can replay them
+HISTORY_SECONDS = int(PROGRESS_CONFIG.get("history_minutes", 60) * 60)
+# Comment lines sent while a run is quiet, so proxies keep the stream open
+HEARTBEAT_SECONDS = PROGRESS_CONFIG.get("heartbeat_seconds", 15)
+# Stream report tokens as they are generated instead of only the final file
+STREAM_REPORTS = PROGRESS_CONFIG.get("stream_reports", True)
+# Tokens are batched into one report_delta event per interval or size limit
+DELTA_INTERVAL = PROGRESS_CONFIG.get("delta_interval_ms", 250) / 1000
+DELTA_MAX_CHARS = PROGRESS_CONFIG.get("delta_max_chars", 2048)
+# How long a finished report's stream waits for its artifacts to render
+RENDER_WAIT_SECONDS = PROGRESS_CONFIG.get("render_wait_seconds", 120)
+
+# Number the event, append it to the replay log and publish it in one step
+_PUBLISH_SCRIPT = """
+local seq = redis.call('incr', KEYS[1])
+local payload = '{"seq": ' .. seq .. ', ' .. string.sub(ARGV[1], 2)
+redis.call('rpush', KEYS[2], payload)
+redis.call('expire', KEYS[1], ARGV[2])
+redis.call('expire', KEYS[2], ARGV[2])
+redis.call('publish', KEYS[3], payload)
+return seq
+"""
+
+_client = None
+_publish = None
+_client_lock = threading.Lock()
+_delta_publisher: Optional[ThreadPoolExecutor] = None
+_delta_publisher_pid: Optional[int] = None
+
+
+def _keys(task_id: str) -> List[str]:
+    return [f"progress:{task_id}:seq", f"progress:{task_id}:log", f"progress:{task_id}"]
+
+
+def _redis_url() -> str:
+    return PROGRESS_CONFIG.get("url", CONFIG["redis"]["url"])
+
+
+def _get_publisher():
+    global _client, _publish
+    if _publish is None:
+        with _client_lock:
+            if _publish is None:
+                import redis
+                _client = redis.Redis.from_url(_redis_url())
+                _publish = _client.register_script(_PUBLISH_SCRIPT)
+    return _client, _publish
+
+
+def publish_events(events: Iterable[Tuple[str, str, Dict[str, Any]]]):
+    """
+    Publish progress events for one or more runs in a single round trip
+
+    Progress is advisory: failures are logged, never raised, so a Redis
+    outage can't fail a report.
+
+    Args:
+        events: (task_id, event, data) triples
+    """
+    try:
+        client, publish = _get_publisher()
+        pipe = client.pipeline(transaction=False)
+        for task_id, event, data in events:
+            payload = json.dumps({"event": event, "time": time.time(), **data}, default=str)
+            publish(keys=_keys(task_id), args=[payload, HISTORY_SECONDS], client=pipe)
+        pipe.execute()
+    except Exception as e:
+        print(f"Failed to publish progress events: {str(e)}")
+
+
+def _get_delta_publisher() -> ThreadPoolExecutor:
+    """Single publishing thread for this process (threads don't survive fork)"""
+    global _delta_publisher, _delta_publisher_pid
+    with _client_lock:
+        if _delta_publisher is None or _delta_publisher_pid != os.getpid():
+            _delta_publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="progress")
+            _delta_publisher_pid = os.getpid()
+        return _delta_publisher
+
+
+def publish_event(task_id: str, event: str, **data):
+    """
+    Publish one progress event for a report run
+
+    Args:
+        task_id: Task that owns the run
+        event: queued, running, llm_turn, tool_start, tool_end, tool_error,
+            report_delta, writing_report, success, rendering, rendered or failed
+        **data: JSON-serializable details
+    """
+    publish_events([(task_id, event, data)])
+
+
+def is_terminal(payload: Dict[str, Any]) -> bool:
+    """
+    True for the event after which a run produces nothing more
+
+    failed, rendered, or success when no artifacts were queued; a success
+    with rendering set is followed by rendering and rendered.
+    """
+    if payload["event"] == "success":
+        return not payload.get("rendering")
+    return payload["event"] in ("rendered", "failed")
+
+
+class ProgressCallbackHandler(BaseCallbackHandler):
+    """LangChain callbacks that turn agent activity into progress events"""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.turn = 0
+        self._tools: Dict[Any, str] = {}
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.turn += 1
+        publish_event(self.task_id, "llm_turn", turn=self.turn)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tools[kwargs.get("run_id")] = name
+        publish_event(self.task_id, "tool_start", tool=name)
+
+    def on_tool_end(self, output, **kwargs):
+        name = self._tools.pop(kwargs.get("run_id"), "tool")
+        publish_event(self.task_id, "tool_end", tool=name)
+
+    def on_tool_error(self, error, **kwargs):
+        name = self._tools.pop(kwargs.get("run_id"), "tool")
+        publish_event(self.task_id, "tool_error", tool=name, error=str(error))
+
+
+def message_text(message) -> str:
+    """Text of a message chunk, skipping tool-call blocks"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+        if not isinstance(block, dict) or block.get("type") == "text"
+    )
+
+
+class ReportStream:
+    """
+    Publishes the agent's output tokens as report_delta events
+
+    Each model turn is its own growing text. The last turn is the report;
+    earlier ones are the agent's notes before tool calls. Tokens are batched
+    so a long report costs a few hundred events, not one per token.
+
+    feed() runs on the shared agent event loop, so events are handed to one
+    publishing thread, which keeps their order, instead of waiting on Redis
+    there. Await drain() before publishing the run's outcome.
+    """
+
+    def __init__(self, task_id: str, interval: float = DELTA_INTERVAL, max_chars: int = DELTA_MAX_CHARS):
+        self.task_id = task_id
+        self.interval = interval
+        self.max_chars = max_chars
+        self.turn = 0
+        self.offset = 0
+        self._message_id = None
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._pending: Optional[Future] = None
+
+    def feed(self, message):
+        """Add one streamed message chunk from LangGraph's "messages" stream mode"""
+        # Models that don't stream deliver the whole AIMessage at once
+        if not isinstance(message, AIMessage):
+            return
+        if message.id != self._message_id:
+            self.flush()
+            self._message_id = message.id
+            self.turn += 1
+            self.offset = 0
+        text = message_text(message)
+        if not text:
+            return
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.max_chars or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Publish buffered text as one report_delta event"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._pending = _get_delta_publisher().submit(
+            publish_event, self.task_id, "report_delta", turn=self.turn, offset=self.offset, text=text
+        )
+        self.offset += len(text)
+        self._buffer, self._buffered = [], 0
+
+    async def drain(self):
+        """Flush, then wait until every report_delta of this run is published"""
+        self.flush()
+        if self._pending is not None:
+            await asyncio.wrap_future(self._pending)
+
+
+def format_sse(payload: Dict[str, Any]) -> str:
+    """Encode one event in the text/event-stream format"""
+    lines = []
+    if "seq" in payload:
+        lines.append(f"id: {payload['seq']}")
+    lines.append(f"event: {payload['event']}")
+    lines.append(f"data: {json.dumps(payload, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_events(task_id: str, last_seq: int = 0,
+                        is_disconnected=None, check_status=None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield a run's progress events: the replay log first, then live ones
+
+    The subscription is opened before the log is read, and events are
+    de-duplicated by sequence number, so nothing published in between is lost.
+
+    Args:
+        task_id: Task that owns the run
+        last_seq: Skip events up to this sequence number (SSE Last-Event-ID)
+        is_disconnected: Optional coroutine function; stop once it returns True
+        check_status: Optional coroutine function called on each heartbeat and
+            returning a terminal event dict if the run already finished, e.g.
+            because the worker died before publishing
+
+    Yields:
+        Event dicts, or None as a heartbeat while the run is quiet
+    """
+    import redis.asyncio as aioredis
+
+    seq_key, log_key, channel = _keys(task_id)
+    client = aioredis.Redis.from_url(_redis_url())
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(channel)
+        for raw in await client.lrange(log_key, 0, -1):
+            payload = json.loads(raw)
+            if payload["seq"] > last_seq:
+                last_seq = payload["seq"]
+                yield payload
+                if is_terminal(payload):
+                    return
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=HEARTBEAT_SECONDS)
+            if message is not None:
+                payload = json.loads(message["data"])
+                if payload["seq"] <= last_seq:
+                    continue
+                last_seq = payload["seq"]
+                yield payload
+                if is_terminal(payload):
+                    return
+                continue
+
+            if is_disconnected is not None and await is_disconnected():
+                return
+            finished = await check_status() if check_status is not None else None
+            if finished:
+                yield finished
+                return
+            yield None
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,114 @@
+# app/rendering.py
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from config.config_load import CONFIG
+
+
+class RenderServiceBusy(Exception):
+    """Raised when max_queue renders are already waiting for a worker"""
+
+
+def _init_worker():
+    # Parse the stylesheet and fonts before the first job arrives
+    from app.utils import warm_up
+    warm_up()
+
+
+def _render(report_path: str, extension: str) -> str:
+    from app.artifacts import render_artifact
+    return render_artifact(report_path, extension)
+
+
+class RenderService:
+    """
+    Process pool that renders report artifacts for the API
+
+    WeasyPrint layout is CPU-bound and holds the GIL, so renders run in
+    separate processes that keep the parsed stylesheet and font
+    configuration warm. Concurrent requests for the same artifact share one
+    render, and admission is capped at workers + max_queue.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 32):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._in_flight = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "coalesced": 0, "render_seconds_total": 0.0}
+
+    async def render(self, report_path: str, extension: str) -> str:
+        """
+        Render an artifact in the pool without blocking the event loop
+
+        Raises:
+            RenderServiceBusy: If the queue is full
+        """
+        key = (report_path, extension)
+        pending = self._pending.get(key)
+        if pending is not None:
+            with self._lock:
+                self._counters["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise RenderServiceBusy("Report rendering queue is full")
+            self._in_flight += 1
+            executor = self._get_executor()
+
+        started = time.monotonic()
+        future = asyncio.ensure_future(
+            asyncio.get_running_loop().run_in_executor(executor, _render, report_path, extension)
+        )
+        self._pending[key] = future
+        outcome = "failed"
+        try:
+            path = await asyncio.shield(future)
+            outcome = "completed"
+            return path
+        finally:
+            self._pending.pop(key, None)
+            with self._lock:
+                self._in_flight -= 1
+                self._counters[outcome] += 1
+                self._counters["render_seconds_total"] += time.monotonic() - started
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and render counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.workers),
+                **self._counters,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the API process runs threads that must not be cloned mid-lock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+
+render_service = RenderService(
+    workers=CONFIG.get("rendering", {}).get("workers", 2),
+    max_queue=CONFIG.get("rendering", {}).get("max_queue", 32)
+)
@@ -0,0 +1,208 @@
+# app/report_cache.py
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from app.data_loader import data_loader
+from app.agents.research_agent import agent_mode, prompt_version
+from config.config_load import CONFIG
+
+REPORT_CACHE_CONFIG = CONFIG.get("report_cache", {})
+# A successful report younger than this is reused instead of rerunning the agent
+FRESHNESS_SECONDS = int(REPORT_CACHE_CONFIG.get("freshness_hours", 24) * 3600)
+# Pending runs older than this are presumed lost and not attached to
+INFLIGHT_SECONDS = int(REPORT_CACHE_CONFIG.get("inflight_minutes", 30) * 60)
+# How long create_task waits for another request claiming the same key
+LOCK_TIMEOUT = 5
+
+
+def report_cache_key(company_id: str) -> str:
+    """
+    Content address of a report: everything that determines the agent's input
+
+    Args:
+        company_id: Company the report is for
+
+    Returns:
+        Hex digest of (company_id, dataset version, model, prompt version, agent mode)
+    """
+    parts = [str(company_id), data_loader.dataset_version, CONFIG["anthropic"]["model"], prompt_version(), agent_mode()]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def claim_report(conn, task_id: str, company_id: str, user_id: str, cache_key: str) -> Dict[str, Any]:
+    """
+    Record a new task, reusing a fresh report or an in-flight run when possible
+
+    Runs under a MySQL named lock on cache_key so two simultaneous requests
+    for the same report can't both decide to start a run.
+
+    Args:
+        conn: Pooled database connection
+        task_id: ID of the task being created
+        company_id: Company the report is for
+        user_id: Owner of the new task
+        cache_key: Result of report_cache_key(company_id)
+
+    Returns:
+        The inserted task's status, report_path, completed flag and source_task_id,
+        plus "dispatch": True when the caller must start generate_report_task
+    """
+    enabled = REPORT_CACHE_CONFIG.get("enabled", True)
+    lock_name = f"report:{cache_key}"
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (lock_name, LOCK_TIMEOUT))
+        locked = bool((cursor.fetchone() or {}).get("acquired"))
+        try:
+            source = _find_source(cursor, cache_key) if enabled and locked else None
+
+            if source and source["status"] == "success":
+                cursor.execute(
+                    """
+                    INSERT INTO tasks
+                    (task_id, company_id, status, user_id, cache_key, source_task_id, report_path, completed_at)
+                    VALUES (%s, %s, 'success', %s, %s, %s, %s, NOW())
+                    """,
+                    (task_id, company_id, user_id, cache_key, source["task_id"], source["report_path"])
+                )
+                result = {"status": "success", "report_path": source["report_path"],
+                          "source_task_id": source["task_id"], "dispatch": False}
+            else:
+                source_task_id = source["task_id"] if source else None
+                cursor.execute(
+                    """
+                    INSERT INTO tasks
+                    (task_id, company_id, status, user_id, cache_key, source_task_id)
+                    VALUES (%s, %s, 'pending', %s, %s, %s)
+                    """,
+                    (task_id, company_id, user_id, cache_key, source_task_id)
+                )
+                result = {"status": "pending", "report_path": None,
+                          "source_task_id": source_task_id, "dispatch": source is None}
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if locked:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+
+
+def _find_source(cursor, cache_key: str) -> Optional[Dict[str, Any]]:
+    """Newest fresh successful report for cache_key, else the in-flight run producing it"""
+    cursor.execute(
+        """
+        SELECT task_id, source_task_id, report_path, status FROM tasks
+        WHERE cache_key = %s AND status = 'success'
+          AND completed_at >= NOW() - INTERVAL %s SECOND
+        ORDER BY completed_at DESC
+        LIMIT 1
+        """,
+        (cache_key, FRESHNESS_SECONDS)
+    )
+    hit = cursor.fetchone()
+    if hit and hit["report_path"] and os.path.exists(hit["report_path"]):
+        # Point at the run that produced the file, not at another cache hit
+        return {**hit, "task_id": hit["source_task_id"] or hit["task_id"]}
+
+    cursor.execute(
+        """
+        SELECT task_id, report_path, status FROM tasks
+        WHERE cache_key = %s AND status = 'pending' AND source_task_id IS NULL
+          AND created_at >= NOW() - INTERVAL %s SECOND
+        ORDER BY created_at DESC
+        LIMIT 1
+        """,
+        (cache_key, INFLIGHT_SECONDS)
+    )
+    return cursor.fetchone()
+
+
+def claim_reports_batch(conn, items: List[Tuple[str, str]], user_id: str) -> List[Dict[str, Any]]:
+    """
+    Batch form of claim_report: record many tasks with one lookup and one insert
+
+    Cache hits and in-flight runs are resolved for all keys at once, and
+    duplicate companies within the batch share a single run. Unlike
+    claim_report no named locks are taken, so a concurrent single request may
+    still start its own run for the same key.
+
+    Args:
+        conn: Pooled database connection
+        items: (task_id, company_id) pairs, already validated
+        user_id: Owner of the new tasks
+
+    Returns:
+        One dict per item, in order, shaped like claim_report's result
+        plus task_id and company_id
+    """
+    enabled = REPORT_CACHE_CONFIG.get("enabled", True)
+    keys = {company_id: report_cache_key(company_id) for _, company_id in items}
+    hits, inflight = {}, {}
+    with conn.cursor() as cursor:
+        if enabled and keys:
+            unique_keys = list(set(keys.values()))
+            placeholders = ", ".join(["%s"] * len(unique_keys))
+            cursor.execute(
+                f"""
+                SELECT cache_key, task_id, source_task_id, report_path FROM tasks
+                WHERE cache_key IN ({placeholders}) AND status = 'success'
+                  AND completed_at >= NOW() - INTERVAL %s SECOND
+                ORDER BY completed_at DESC
+                """,
+                (*unique_keys, FRESHNESS_SECONDS)
+            )
+            for row in cursor.fetchall():
+                if row["cache_key"] not in hits and row["report_path"] and os.path.exists(row["report_path"]):
+                    hits[row["cache_key"]] = row
+            cursor.execute(
+                f"""
+                SELECT cache_key, task_id FROM tasks
+                WHERE cache_key IN ({placeholders}) AND status = 'pending' AND source_task_id IS NULL
+                  AND created_at >= NOW() - INTERVAL %s SECOND
+                ORDER BY created_at DESC
+                """,
+                (*unique_keys, INFLIGHT_SECONDS)
+            )
+            for row in cursor.fetchall():
+                inflight.setdefault(row["cache_key"], row["task_id"])
+
+        now = datetime.now()
+        results, rows = [], []
+        for task_id, company_id in items:
+            cache_key = keys[company_id]
+            hit = hits.get(cache_key)
+            if hit:
+                source_task_id = hit["source_task_id"] or hit["task_id"]
+                result = {"status": "success", "report_path": hit["report_path"],
+                          "source_task_id": source_task_id, "dispatch": False}
+            elif cache_key in inflight:
+                result = {"status": "pending", "report_path": None,
+                          "source_task_id": inflight[cache_key], "dispatch": False}
+            else:
+                result = {"status": "pending", "report_path": None, "source_task_id": None, "dispatch": True}
+                if enabled:
+                    # Later duplicates in this batch follow this run
+                    inflight[cache_key] = task_id
+            results.append({"task_id": task_id, "company_id": company_id, **result})
+            rows.append((
+                task_id, company_id, result["status"], user_id, cache_key, result["source_task_id"],
+                result["report_path"], now if result["status"] == "success" else None
+            ))
+
+        try:
+            # pymysql folds executemany on INSERT ... VALUES into multi-row statements
+            cursor.executemany(
+                """
+                INSERT INTO tasks
+                (task_id, company_id, status, user_id, cache_key, source_task_id, report_path, completed_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                rows
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return results
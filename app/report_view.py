@@ -0,0 +1,161 @@
+# app/report_view.py
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from fastapi import Request, Response
+from app.artifacts import ensure_artifact
+from config.config_load import CONFIG
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+def render_view_page(html_content: str, task_id: str) -> str:
+    """Wrap a report's HTML fragment in the styled viewer page"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Equity Research Report</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
+            h1 {{ color: #333366; }}
+            h2 {{ color: #333366; border-bottom: 1px solid #cccccc; padding-bottom: 5px; }}
+            table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
+            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+            th {{ background-color: #f2f2f2; }}
+            .container {{ max-width: 1000px; margin: 0 auto; }}
+            .download-link {{ display: inline-block; margin-top: 20px; padding: 10px 15px;
+                           background-color: #4CAF50; color: white; text-decoration: none;
+                           border-radius: 4px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            {html_content}
+            <a href="/reports/{task_id}" class="download-link">Download PDF</a>
+        </div>
+    </body>
+    </html>
+    """
+
+
+class ViewPage:
+    """A rendered viewer page with its pre-compressed encodings"""
+
+    def __init__(self, body: bytes, source: tuple):
+        self.source = source
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.encodings = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(body, quality=5)
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for data in self.encodings.values())
+
+
+class ViewPageCache:
+    """
+    Bounded LRU of rendered viewer pages keyed by task_id
+
+    Each entry remembers the (size, mtime) of the markdown it was built from
+    and is rebuilt when the report file changes.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ViewPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    async def get(self, task_id: str, report_path: str) -> ViewPage:
+        """Return the cached page for task_id, rebuilding it if missing or stale"""
+        stat = os.stat(report_path)
+        source = (report_path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            page = self._entries.get(task_id)
+            if page is not None and page.source == source:
+                self._entries.move_to_end(task_id)
+                self._counters["hits"] += 1
+                return page
+            self._counters["misses"] += 1
+
+        # Rendered once per report and stored next to the markdown
+        html_path = await ensure_artifact(report_path, "html")
+        with open(html_path, "r") as f:
+            html_content = f.read()
+        page = ViewPage(render_view_page(html_content, task_id).encode("utf-8"), source)
+
+        with self._lock:
+            self._entries[task_id] = page
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+        return page
+
+    def invalidate(self, task_id: str):
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(page.size for page in self._entries.values()),
+                **self._counters,
+            }
+
+
+def _accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def view_response(request: Request, page: ViewPage) -> Response:
+    """
+    Serve a cached page, compressed per Accept-Encoding, with ETag revalidation
+    """
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    encoding = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in page.encodings and accepted.get(candidate, accepted.get("*", 0)) > 0:
+            encoding = candidate
+            break
+
+    # Each encoding is a different representation, so it gets its own strong tag
+    etag = page.etag if encoding == "identity" else page.etag[:-1] + "-" + encoding + '"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=page.encodings[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+
+view_page_cache = ViewPageCache(CONFIG["app"].get("VIEW_CACHE_ENTRIES", 256))
@@ -1,12 +1,82 @@
 # app/tasks.py
-from config.celery_config import celery_app
-from app.database import get_db_connection
+from config.celery_config import celery_app, PRIORITY_STEPS
+from app.database import get_db_connection, configure_pool
 from datetime import datetime
 import os
+import time
 from config.config_load import CONFIG
-import asyncio
-from app.agents.research_agent import AnthropicAgent
-from langchain_core.messages import HumanMessage
+from app.agent_runtime import get_agent_runtime
+from app.progress import publish_event
+from app.tracing import TraceRecorder, save_trace
+from app.agents.rate_limit import RATE_LIMIT_CONFIG, retry_after
+from app.metrics import (
+    REPORT_WRITE_SECONDS, TASK_SECONDS, TASK_WAIT_SECONDS, METRICS_CONFIG, build_registry, mark_process_dead
+)
+from celery import group
+from celery.signals import (
+    worker_process_init, worker_process_shutdown, worker_init,
+    before_task_publish, task_prerun, task_postrun
+)
+
+
+@worker_process_init.connect
+def init_worker_db_pool(**kwargs):
+    """Give each prefork child its own small connection pool"""
+    configure_pool(CONFIG["database"].get("worker_pool_size", 2))
+
+
+@worker_init.connect
+def init_shared_worker_db_pool(sender=None, **kwargs):
+    """
+    Size the pool of a worker whose tasks all run in one process
+
+    Thread (and solo) pools start no children, so worker_process_init never
+    fires for them; their tasks share this process's pool, one connection
+    per concurrent task.
+    """
+    from celery.concurrency import get_implementation
+    if sender is None or get_implementation(sender.pool_cls) is get_implementation("prefork"):
+        return
+    configure_pool(max(CONFIG["database"].get("worker_pool_size", 2), sender.concurrency or 1))
+
+
+@worker_process_shutdown.connect
+def release_worker_metrics(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Serve this worker's metrics (all children, in multiprocess mode) for Prometheus"""
+    port = METRICS_CONFIG.get("worker_port", 0)
+    if port:
+        from prometheus_client import start_http_server
+        start_http_server(port, registry=build_registry())
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    # Read back in task_prerun to measure queue wait
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def observe_task_start(task_id=None, task=None, **kwargs):
+    enqueued_at = task.request.get("enqueued_at")
+    if enqueued_at:
+        TASK_WAIT_SECONDS.labels(task.name).observe(max(0.0, time.time() - enqueued_at))
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def observe_task_end(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
 
 
 def update_task_status(
@@ -15,7 +85,12 @@ def update_task_status(
     report_path: str = None, 
     error: str = None
 ):
-    """Helper to update task status with proper fields"""
+    """
+    Helper to update task status with proper fields
+
+    Tasks that attached to this run (source_task_id) and are still pending
+    receive the same outcome.
+    """
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
@@ -27,8 +102,9 @@ def update_task_status(
                         report_path = %s,
                         error_message = NULL
                     WHERE task_id = %s
+                       OR (source_task_id = %s AND status = 'pending')
                 """
-                params = (status, report_path, task_id)
+                params = (status, report_path, task_id, task_id)
             else:
                 query = """
                     UPDATE tasks 
@@ -37,8 +113,9 @@ def update_task_status(
                         report_path = NULL,
                         error_message = %s
                     WHERE task_id = %s
+                       OR (source_task_id = %s AND status = 'pending')
                 """
-                params = (status, error, task_id)
+                params = (status, error, task_id, task_id)
                 
             cursor.execute(query, params)
         conn.commit()
@@ -49,6 +126,29 @@ def update_task_status(
         conn.close()
         
 
+# Each further FAIR_SHARE_STEP reports a user already has waiting drop a new
+# report one priority level, so a large batch can't hold up other users
+FAIR_SHARE_STEP = CONFIG.get("celery", {}).get("fair_share_step", 10)
+
+
+def fair_priority(rank: int) -> int:
+    """
+    Broker priority for a user's report
+
+    Args:
+        rank: Reports the same user already has queued or running ahead of this one
+
+    Returns:
+        Priority level, 0 (first) to the lowest step
+    """
+    return min(PRIORITY_STEPS[-1], max(0, rank) // FAIR_SHARE_STEP)
+
+
+def dispatch_report(task_id: str, company_id: str, rank: int = 0):
+    """Queue one report at its user's fair-share priority"""
+    return generate_report_task.apply_async((task_id, company_id), priority=fair_priority(rank))
+
+
 @celery_app.task(bind=True, max_retries=3)
 def generate_report_task(self, task_id: str, company_id: str):
     """
@@ -61,19 +161,20 @@ def generate_report_task(self, task_id: str, company_id: str):
 
     reports_dir = CONFIG["app"]["reports_path"]
     os.makedirs(reports_dir, exist_ok=True)
+    publish_event(task_id, "running", company_id=company_id)
+    trace = TraceRecorder()
     try:
-        response = asyncio.run(_execute_agent(company_id))
-        
-        # Save raw response to file
-        raw_response_path = os.path.join(reports_dir, f"{task_id}_raw.txt")
-        with open(raw_response_path, "w") as f:
-            f.write(str(response))
-            
+        # Runs on this process's shared agent loop alongside other reports
+        response = get_agent_runtime().run(company_id, task_id, callbacks=[trace])
+        trace.finish()
+        write_started = time.perf_counter()
+
         # Extract content from AIMessage
         report_content = response["messages"][-1].content if response.get("messages") else ""
         
         if not report_content:
             raise ValueError("Empty response from agent")
+        publish_event(task_id, "writing_report")
         # Create timestamp for filename
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
 
@@ -82,21 +183,102 @@ def generate_report_task(self, task_id: str, company_id: str):
         md_path = os.path.join(reports_dir, md_filename)
         with open(md_path, "w") as f:
             f.write(report_content)
+        REPORT_WRITE_SECONDS.observe(time.perf_counter() - write_started)
 
         # Update task status to completed
         update_task_status(task_id, "success", report_path=md_path)
+        _save_run_trace(task_id, company_id, trace, "success")
+
+        # Render HTML/PDF once, next to the markdown, for the download endpoints;
+        # event streams stay open until the render task publishes rendered.
+        # Published first so a fast render worker can't overtake it.
+        publish_event(task_id, "success", rendering=True)
+        try:
+            render_report_artifacts_task.delay(md_path, task_id)
+        except Exception as e:
+            # The report already succeeded: downloads render the artifacts on first request
+            print(f"Failed to queue artifact rendering for {task_id}: {str(e)}")
+            publish_event(task_id, "rendered", formats=[], error=str(e))
         # return {
         #     "status": "success",
         #     "task_id": task_id,
         #     "report_path": md_path
         # }
     except Exception as e:
+        backoff = retry_after(e)
+        if backoff is not None and self.request.retries < self.max_retries:
+            # Rate limited even after the limiter's own retries: free this
+            # worker slot and run again later, backing off further each time
+            countdown = max(backoff, RATE_LIMIT_CONFIG.get("task_retry_seconds", 30) * 2 ** self.request.retries)
+            publish_event(task_id, "retrying", error=str(e), countdown=countdown)
+            raise self.retry(exc=e, countdown=countdown)
         update_task_status(task_id, "failed", error=str(e))
+        trace.finish()
+        _save_run_trace(task_id, company_id, trace, "failed")
+        publish_event(task_id, "failed", error=str(e))
         raise e
 
-async def _execute_agent(company_id: str) -> dict:
-    """Wrapper to run async agent workflow in Celery task"""
-    agent = AnthropicAgent.initialize(CONFIG["anthropic"]["model"],CONFIG["anthropic"]["api_key"])
-    executor = agent.build_executor()
-    query = f"Generate report for company {company_id}"
-    return await executor.ainvoke({"messages": [HumanMessage(content=query)]})
\ No newline at end of file
+
+def _save_run_trace(task_id: str, company_id: str, trace: TraceRecorder, status: str):
+    from app.agents.research_agent import agent_mode, prompt_version
+    save_trace(task_id, company_id, trace, status, model=CONFIG["anthropic"]["model"],
+               prompt_version=prompt_version(), agent_mode=agent_mode())
+
+@celery_app.task
+def render_report_artifacts_task(report_path: str, task_id: str = None):
+    """
+    Celery task rendering the HTML and PDF artifacts of a finished report
+
+    Args:
+        report_path: Path to the markdown report
+        task_id: Task receiving rendering/rendered progress events
+    """
+    from app.artifacts import render_artifacts
+    rendered = {}
+    if task_id:
+        publish_event(task_id, "rendering")
+    try:
+        rendered = render_artifacts(report_path)
+        return rendered
+    finally:
+        if task_id:
+            publish_event(task_id, "rendered", formats=sorted(rendered))
+
+
+@celery_app.task
+def prefetch_market_data_task(company_ids: list, period: str = "1y"):
+    """
+    Celery task warming the market data cache for a batch of companies
+
+    Args:
+        company_ids: Companies whose reports are about to be generated
+        period: History period the agent will request
+    """
+    from app.prefetch import prefetch_market_data
+    try:
+        return prefetch_market_data(company_ids, period)
+    except Exception as e:
+        # Never fail the chain: report tasks can still fetch on their own
+        print(f"Market data prefetch failed: {str(e)}")
+        return {"tickers": [], "failed": {"*": str(e)}}
+
+
+def dispatch_reports_with_prefetch(tasks: list, first_rank: int = 0):
+    """
+    Queue report generation for many companies behind a single prefetch
+
+    Args:
+        tasks: (task_id, company_id) pairs already recorded as pending
+        first_rank: Reports the user already had waiting before this batch;
+                    later tasks in the batch get progressively lower priority
+
+    Returns:
+        AsyncResult of the chain
+    """
+    company_ids = sorted({company_id for _, company_id in tasks})
+    prefetch = prefetch_market_data_task.si(company_ids)
+    reports = group(
+        generate_report_task.si(task_id, company_id).set(priority=fair_priority(first_rank + i))
+        for i, (task_id, company_id) in enumerate(tasks)
+    )
+    return (prefetch | reports).apply_async()
@@ -0,0 +1,169 @@
+# app/tracing.py
+import gzip
+import json
+import time
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from app.database import get_db_connection
+
+# Summary columns of task_traces that GET /traces/stats may group by
+TRACE_GROUPS = {
+    "day": "DATE(tr.created_at)",
+    "model": "tr.model",
+    "prompt_version": "tr.prompt_version",
+    "agent_mode": "tr.agent_mode",
+    "company_id": "tr.company_id",
+}
+
+
+def _preview(value: Any, limit: int = 500) -> Any:
+    """Tool arguments as recorded: JSON values kept, long strings cut"""
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + "..."
+    return value
+
+
+class TraceRecorder(BaseCallbackHandler):
+    """
+    Structured trace of one agent run
+
+    Records every model turn (latency, input/output/cached tokens) and every
+    tool call (arguments, latency, payload size), in order of completion.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.turns: List[Dict[str, Any]] = []
+        self.tools: List[Dict[str, Any]] = []
+        self._open: Dict[Any, Dict[str, Any]] = {}
+        self._turn_count = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._turn_count += 1
+        self._open[kwargs.get("run_id")] = {
+            "turn": self._turn_count,
+            "started": time.time(),
+            "messages": sum(len(batch) for batch in messages),
+        }
+
+    def on_llm_end(self, response, **kwargs):
+        entry = self._open.pop(kwargs.get("run_id"), None)
+        if entry is None:
+            return
+        usage: Dict[str, Any] = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        details = usage.get("input_token_details") or {}
+        started = entry.pop("started")
+        self.turns.append({
+            **entry,
+            "offset": round(started - self.started, 3),
+            "latency": round(time.time() - started, 3),
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cache_read_tokens": details.get("cache_read", 0),
+            "cache_creation_tokens": details.get("cache_creation", 0),
+        })
+
+    def on_llm_error(self, error, **kwargs):
+        entry = self._open.pop(kwargs.get("run_id"), None)
+        if entry is not None:
+            started = entry.pop("started")
+            self.turns.append({**entry, "offset": round(started - self.started, 3),
+                               "latency": round(time.time() - started, 3), "error": str(error)})
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        inputs = kwargs.get("inputs")
+        self._open[kwargs.get("run_id")] = {
+            "tool": (serialized or {}).get("name") or kwargs.get("name") or "tool",
+            "args": {k: _preview(v) for k, v in inputs.items()} if isinstance(inputs, dict) else _preview(input_str),
+            "started": time.time(),
+        }
+
+    def on_tool_end(self, output, **kwargs):
+        self._finish_tool(kwargs.get("run_id"), output=output)
+
+    def on_tool_error(self, error, **kwargs):
+        self._finish_tool(kwargs.get("run_id"), error=error)
+
+    def _finish_tool(self, run_id, output: Any = None, error: Optional[BaseException] = None):
+        entry = self._open.pop(run_id, None)
+        if entry is None:
+            return
+        started = entry.pop("started")
+        entry.update(offset=round(started - self.started, 3), latency=round(time.time() - started, 3))
+        if error is not None:
+            entry["error"] = str(error)
+        else:
+            content = getattr(output, "content", output)
+            # Characters the model receives for this call
+            entry["payload_chars"] = len(content if isinstance(content, str) else json.dumps(content, default=str))
+        self.tools.append(entry)
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals stored alongside the trace for aggregate queries"""
+        return {
+            "wall_seconds": round((self.finished or time.time()) - self.started, 3),
+            "llm_turns": len(self.turns),
+            "tool_calls": len(self.tools),
+            "input_tokens": sum(t.get("input_tokens", 0) for t in self.turns),
+            "output_tokens": sum(t.get("output_tokens", 0) for t in self.turns),
+            "cached_tokens": sum(t.get("cache_read_tokens", 0) for t in self.turns),
+            "tool_payload_chars": sum(t.get("payload_chars", 0) for t in self.tools),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"started_at": self.started, **self.summary(), "turns": self.turns, "tools": self.tools}
+
+
+def save_trace(task_id: str, company_id: str, trace: TraceRecorder, status: str,
+               model: Optional[str] = None, prompt_version: Optional[str] = None,
+               agent_mode: Optional[str] = None):
+    """
+    Store a run's trace as gzipped JSON with its summary columns
+
+    Failures are logged, never raised: a lost trace must not fail the report.
+    """
+    summary = trace.summary()
+    body = gzip.compress(json.dumps(trace.to_dict(), separators=(",", ":"), default=str).encode("utf-8"))
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                REPLACE INTO task_traces
+                (task_id, company_id, status, model, prompt_version, agent_mode, wall_seconds, llm_turns,
+                 tool_calls, input_tokens, output_tokens, cached_tokens, tool_payload_chars, trace)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (task_id, company_id, status, model, prompt_version, agent_mode, summary["wall_seconds"],
+                 summary["llm_turns"], summary["tool_calls"], summary["input_tokens"],
+                 summary["output_tokens"], summary["cached_tokens"], summary["tool_payload_chars"], body)
+            )
+        conn.commit()
+    except Exception as e:
+        print(f"Failed to save trace for {task_id}: {str(e)}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def load_trace(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode a task_traces row into the full trace"""
+    trace = json.loads(gzip.decompress(row["trace"]))
+    return {
+        "task_id": row["task_id"],
+        "company_id": row["company_id"],
+        "status": row["status"],
+        "model": row["model"],
+        "prompt_version": row["prompt_version"],
+        "agent_mode": row["agent_mode"],
+        "created_at": row["created_at"],
+        **trace,
+    }
@@ -2,10 +2,58 @@
 import os
 from pathlib import Path
 import markdown
-from weasyprint import HTML
-import tempfile
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
 from config.config_load import CONFIG
 
+PDF_STYLESHEET = """
+@page { margin: 1cm; }
+body { font-family: Arial, sans-serif; margin: 0; }
+h1 { color: #333366; }
+h2 { color: #333366; border-bottom: 1px solid #cccccc; padding-bottom: 5px; }
+table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+th { background-color: #f2f2f2; }
+"""
+
+PDF_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"></head>
+<body>
+{content}
+</body>
+</html>
+"""
+
+# Parsed lazily by warm_up() and reused for every PDF rendered in this process
+_stylesheet = None
+_font_config = None
+
+def markdown_to_html(md_content):
+    """
+    Convert markdown report content to an HTML fragment
+
+    Args:
+        md_content (str): Markdown text
+
+    Returns:
+        str: HTML fragment (no <html>/<body> wrapper)
+    """
+    return markdown.markdown(md_content, extensions=['tables', 'fenced_code'])
+
+def warm_up():
+    """
+    Parse the PDF stylesheet and font configuration once per process
+
+    Returns:
+        tuple: (CSS stylesheet, FontConfiguration) shared by every render
+    """
+    global _stylesheet, _font_config
+    if _stylesheet is None:
+        _font_config = FontConfiguration()
+        _stylesheet = CSS(string=PDF_STYLESHEET, font_config=_font_config)
+    return _stylesheet, _font_config
+
 def markdown_to_pdf(markdown_path, output_path=None):
     """
     Convert a markdown file to PDF using WeasyPrint
@@ -26,42 +74,14 @@ def markdown_to_pdf(markdown_path, output_path=None):
         md_content = f.read()
     
     # Convert markdown to HTML
-    html_content = markdown.markdown(md_content, extensions=['tables', 'fenced_code'])
-    
-    # Add some basic styling
-    styled_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @page {{ margin: 1cm; }}
-            body {{ font-family: Arial, sans-serif; margin: 0; }}
-            h1 {{ color: #333366; }}
-            h2 {{ color: #333366; border-bottom: 1px solid #cccccc; padding-bottom: 5px; }}
-            table {{ border-collapse: collapse; width: 100%; margin: 20px 0; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-        </style>
-    </head>
-    <body>
-        {html_content}
-    </body>
-    </html>
-    """
-    
-    # Create a temporary HTML file
-    with tempfile.NamedTemporaryFile(suffix='.html', delete=False) as temp:
-        temp_html_path = temp.name
-        temp.write(styled_html.encode('utf-8'))
-    
+    html_content = markdown_to_html(md_content)
+    stylesheet, font_config = warm_up()
+
     try:
-        # Convert HTML to PDF
-        HTML(filename=temp_html_path).write_pdf(output_path)
+        # Render straight from the in-memory document with the pre-parsed stylesheet
+        HTML(string=PDF_TEMPLATE.format(content=html_content)).write_pdf(
+            output_path, stylesheets=[stylesheet], font_config=font_config
+        )
         return output_path
     except Exception as e:
         raise RuntimeError(f"PDF conversion failed: {str(e)}")
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_html_path):
-            os.remove(temp_html_path)
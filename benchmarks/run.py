@@ -0,0 +1,324 @@
+# benchmarks/run.py
+"""
+End-to-end load and latency benchmark
+
+Starts the API and a Celery worker with local stand-ins for Anthropic and
+Yahoo Finance (see benchmarks.stubs), drives a mix of POST /tasks,
+GET /tasks, report views and PDF downloads from concurrent virtual users,
+waits for the queued reports to finish and prints a JSON summary:
+per-endpoint throughput and latency percentiles, worker throughput and
+per-stage timings taken from each run's progress events.
+
+MySQL and Redis from config.toml are used as-is; point them at local
+instances dedicated to benchmarking.
+
+Usage:
+    python -m benchmarks.run --duration 60 --concurrency 32 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import httpx
+from benchmarks.stubs import DEFAULT_STUBS, SETTINGS_ENV
+
+ENDPOINTS = ("create", "list", "view", "download")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 100]"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class LoadState:
+    """Requests measured so far and the tasks the virtual users know about"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.created: List[str] = []
+        self.ready: List[str] = []
+
+    def record(self, endpoint: str, started: float, ok: bool):
+        self.latencies[endpoint].append(round(time.perf_counter() - started, 5))
+        if not ok:
+            self.errors[endpoint] += 1
+
+
+async def request(state: LoadState, endpoint: str, client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        # Read the whole body so downloads are timed end to end
+        await response.aread()
+    except httpx.HTTPError:
+        state.record(endpoint, started, False)
+        return None
+    state.record(endpoint, started, response.status_code < 400)
+    return response
+
+
+async def virtual_user(client: httpx.AsyncClient, state: LoadState, deadline: float,
+                       weights: Dict[str, float], companies: List[str], rng: random.Random):
+    names, values = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        endpoint = rng.choices(names, values)[0]
+        if endpoint in ("view", "download") and not state.ready:
+            endpoint = "list"
+
+        if endpoint == "create":
+            response = await request(state, "create", client, "POST", "/tasks",
+                                     json={"company_id": rng.choice(companies)})
+            if response is not None and response.status_code == 202:
+                state.created.append(response.json()["task_id"])
+        elif endpoint == "list":
+            response = await request(state, "list", client, "GET", "/tasks", params={"limit": 50})
+            if response is not None and response.status_code == 200:
+                done = [t["task_id"] for t in response.json() if t["status"] == "success"]
+                if done:
+                    state.ready = done
+        elif endpoint == "view":
+            await request(state, "view", client, "GET", f"/reports/{rng.choice(state.ready)}/view",
+                          headers={"Accept-Encoding": "gzip, br"})
+        else:
+            await request(state, "download", client, "GET", f"/reports/{rng.choice(state.ready)}")
+
+
+async def run_load(base_url: str, api_key: str, duration: float, concurrency: int,
+                   weights: Dict[str, float], companies: List[str], seed: int) -> LoadState:
+    state = LoadState()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": api_key},
+                                 limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            virtual_user(client, state, deadline, weights, companies, random.Random(seed + i))
+            for i in range(concurrency)
+        ))
+    return state
+
+
+async def drain(base_url: str, api_key: str, task_ids: List[str], timeout: float) -> Dict[str, str]:
+    """Wait for created tasks to leave pending; returns task_id -> final status"""
+    statuses = {task_id: "pending" for task_id in task_ids}
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": api_key}, timeout=30) as client:
+        while time.perf_counter() < deadline:
+            pending = [task_id for task_id, status in statuses.items() if status == "pending"]
+            if not pending:
+                break
+            for task_id in pending:
+                response = await client.get(f"/tasks/{task_id}")
+                if response.status_code == 200:
+                    statuses[task_id] = response.json()["status"]
+            await asyncio.sleep(1)
+    return statuses
+
+
+def run_events(task_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Progress event logs of the runs started by these tasks"""
+    import redis
+    from app.progress import _keys, _redis_url
+    client = redis.Redis.from_url(_redis_url())
+    pipe = client.pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.lrange(_keys(task_id)[1], 0, -1)
+    logs = {}
+    for task_id, raw in zip(task_ids, pipe.execute()):
+        if raw:
+            logs[task_id] = [json.loads(item) for item in raw]
+    return logs
+
+
+def stage_timings(logs: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Per-stage durations from progress events
+
+    queue_wait: queued -> running; time_to_first_content: running -> first
+    report_delta; agent: running -> writing_report; write_report:
+    writing_report -> success; render: rendering -> rendered; end_to_end:
+    queued -> success; plus per-tool call latency and LLM turns per run.
+    """
+    stages: Dict[str, List[float]] = defaultdict(list)
+    tools: Dict[str, List[float]] = defaultdict(list)
+    turns, succeeded = [], []
+    for events in logs.values():
+        first: Dict[str, float] = {}
+        started: Dict[str, List[float]] = defaultdict(list)
+        for event in events:
+            first.setdefault(event["event"], event["time"])
+            if event["event"] == "tool_start":
+                started[event["tool"]].append(event["time"])
+            elif event["event"] in ("tool_end", "tool_error") and started[event["tool"]]:
+                tools[event["tool"]].append(event["time"] - started[event["tool"]].pop(0))
+        spans = {
+            "queue_wait": ("queued", "running"),
+            "time_to_first_content": ("running", "report_delta"),
+            "agent": ("running", "writing_report"),
+            "write_report": ("writing_report", "success"),
+            "render": ("rendering", "rendered"),
+            "end_to_end": ("queued", "success"),
+        }
+        for stage, (start, end) in spans.items():
+            if start in first and end in first:
+                stages[stage].append(round(first[end] - first[start], 4))
+        turns.append(sum(1 for event in events if event["event"] == "llm_turn"))
+        if "success" in first:
+            succeeded.append(first["success"])
+
+    return {
+        "runs": len(logs),
+        "stages": {stage: summarize(values) for stage, values in stages.items()},
+        "tools": {tool: summarize([round(v, 4) for v in values]) for tool, values in tools.items()},
+        "llm_turns_per_run": summarize(turns),
+        "succeeded": len(succeeded),
+        "_success_times": succeeded,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn(module: str, settings: Dict[str, Any]) -> subprocess.Popen:
+    env = {**os.environ, SETTINGS_ENV: json.dumps(settings)}
+    return subprocess.Popen([sys.executable, "-m", module], env=env)
+
+
+def wait_healthy(base_url: str, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"API at {base_url} did not become healthy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load and latency benchmark")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--mix", default="create=1,list=6,view=2,download=1", help="endpoint weights")
+    parser.add_argument("--companies", type=int, default=50, help="distinct companies to request reports for")
+    parser.add_argument("--worker-concurrency", type=int, default=32, help="worker threads")
+    parser.add_argument("--llm-latency", type=float, default=DEFAULT_STUBS["llm_latency"])
+    parser.add_argument("--token-rate", type=float, default=DEFAULT_STUBS["token_rate"])
+    parser.add_argument("--report-tokens", type=int, default=DEFAULT_STUBS["report_tokens"])
+    parser.add_argument("--yahoo-latency", type=float, default=DEFAULT_STUBS["yahoo_latency"])
+    parser.add_argument("--no-report-cache", action="store_true", help="generate every report instead of reusing")
+    parser.add_argument("--pipeline", action="store_true", help="gather data before the agent loop")
+    parser.add_argument("--drain-timeout", type=float, default=300, help="seconds to wait for queued reports")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-url", help="benchmark an already running API and worker instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON summary here as well as to stdout")
+    args = parser.parse_args()
+
+    from config.config_load import CONFIG
+    from app.data_loader import data_loader
+
+    weights = parse_mix(args.mix)
+    companies = sorted(data_loader.valid_company_ids, key=int)[:args.companies]
+    settings = {
+        "port": args.port,
+        "worker_concurrency": args.worker_concurrency,
+        "stubs": {
+            "llm_latency": args.llm_latency, "token_rate": args.token_rate,
+            "report_tokens": args.report_tokens, "yahoo_latency": args.yahoo_latency,
+        },
+        "config": {},
+    }
+    if args.no_report_cache:
+        settings["config"]["report_cache"] = {"enabled": False}
+    if args.pipeline:
+        settings["config"]["agent_runtime"] = {"pipeline": True}
+
+    processes = []
+    base_url = args.base_url
+    if base_url is None:
+        base_url = f"http://127.0.0.1:{args.port}"
+        processes = [spawn("benchmarks.server", settings), spawn("benchmarks.worker", settings)]
+    try:
+        wait_healthy(base_url)
+        api_key = CONFIG["app"]["API_KEY"]
+        started = time.time()
+        state = asyncio.run(run_load(base_url, api_key, args.duration, args.concurrency,
+                                     weights, companies, args.seed))
+        statuses = asyncio.run(drain(base_url, api_key, state.created, args.drain_timeout))
+        workers = stage_timings(run_events(state.created))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    success_times = workers.pop("_success_times")
+    worker_seconds = (max(success_times) - started) if success_times else None
+    result = {
+        "commit": git_commit(),
+        "settings": {**settings, "duration": args.duration, "concurrency": args.concurrency, "mix": weights},
+        "requests": {
+            endpoint: {
+                **summarize(latencies),
+                "errors": state.errors.get(endpoint, 0),
+                "throughput_rps": round(len(latencies) / args.duration, 2),
+            }
+            for endpoint, latencies in state.latencies.items()
+        },
+        "tasks": {
+            "created": len(state.created),
+            "success": sum(1 for s in statuses.values() if s == "success"),
+            "failed": sum(1 for s in statuses.values() if s == "failed"),
+            "pending": sum(1 for s in statuses.values() if s == "pending"),
+        },
+        "worker": {
+            **workers,
+            "throughput_per_s": round(len(success_times) / worker_seconds, 3) if worker_seconds else None,
+        },
+    }
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
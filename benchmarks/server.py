@@ -0,0 +1,16 @@
+# benchmarks/server.py
+"""FastAPI app with benchmark config overrides applied, spawned by benchmarks.run"""
+import uvicorn
+from benchmarks.stubs import load_settings, apply_overrides
+
+
+def main():
+    settings = load_settings()
+    apply_overrides(settings.get("config", {}))
+
+    from app.main import app
+    uvicorn.run(app, host="127.0.0.1", port=settings.get("port", 8765), log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
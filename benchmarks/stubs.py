@@ -0,0 +1,229 @@
+# benchmarks/stubs.py
+"""
+Local stand-ins for the services a report run depends on
+
+install_stubs() replaces ChatAnthropic with FakeAnthropic and yfinance's
+Ticker/download with synthetic data, each with configurable latency, so the
+API and worker can be benchmarked without network access or API spend.
+Everything else (MySQL, Redis, Celery, caches, rendering) runs for real.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Environment variable carrying benchmark settings to spawned processes
+SETTINGS_ENV = "BENCHMARK_SETTINGS"
+
+DEFAULT_STUBS = {
+    "llm_latency": 1.0,      # seconds before each model turn starts answering
+    "token_rate": 200.0,     # report tokens streamed per second
+    "report_tokens": 800,    # length of the generated report
+    "yahoo_latency": 0.2,    # seconds per yfinance call
+}
+
+
+def load_settings() -> Dict[str, Any]:
+    """Settings passed by benchmarks.run: {"config": {...}, "stubs": {...}}"""
+    return json.loads(os.environ.get(SETTINGS_ENV, "{}"))
+
+
+def apply_overrides(overrides: Dict[str, Any]):
+    """
+    Merge config overrides into CONFIG before any app module reads it
+
+    Args:
+        overrides: Section -> {key: value}, e.g. {"report_cache": {"enabled": False}}
+    """
+    from config.config_load import CONFIG
+    for section, values in overrides.items():
+        CONFIG.setdefault(section, {}).update(values)
+
+
+def _words(count: int) -> List[str]:
+    sections = ["Executive Summary", "Company Overview", "Financial Analysis", "Historical Performance",
+                "Investment Thesis", "Risks and Challenges", "Outlook and Recommendations"]
+    filler = "revenue margin growth cash flow leverage valuation outlook demand pricing".split()
+    words = ["# Equity Research Report\n\n"]
+    per_section = max(1, count // len(sections))
+    for section in sections:
+        words.append(f"\n\n## {section}\n\n")
+        words.extend(filler[i % len(filler)] + " " for i in range(per_section))
+    return words
+
+
+class FakeAnthropic(BaseChatModel):
+    """
+    Chat model that plays a fixed two-turn agent run
+
+    Turn one calls company_data_loader, financial_ratios and yahoo_finance
+    for the requested company; turn two streams a markdown report.
+    Accepts ChatAnthropic's constructor arguments.
+    """
+
+    model: str = "fake-anthropic"
+    temperature: float = 0.0
+    api_key: Optional[Any] = None
+    max_retries: int = 2
+    llm_latency: float = DEFAULT_STUBS["llm_latency"]
+    token_rate: float = DEFAULT_STUBS["token_rate"]
+    report_tokens: int = DEFAULT_STUBS["report_tokens"]
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-anthropic"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[tool.name for tool in tools])
+
+    def _usage(self, messages: List[BaseMessage], output_tokens: int) -> Dict[str, int]:
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    def _tool_turn(self, messages: List[BaseMessage]) -> Optional[AIMessage]:
+        if any(isinstance(m, AIMessage) for m in messages):
+            return None
+        match = re.search(r"company (\d+)", str(messages[-1].content))
+        company_id = match.group(1) if match else "1"
+        from app.prefetch import resolve_tickers
+        ticker = resolve_tickers([company_id]).get(company_id, "AAL")
+        calls = [
+            {"name": "company_data_loader", "args": {"company_id": company_id}, "id": "call_company"},
+            {"name": "financial_ratios", "args": {"company_id": company_id}, "id": "call_ratios"},
+            {"name": "yahoo_finance", "args": {"ticker": ticker, "period": "1y"}, "id": "call_yahoo"},
+        ]
+        return AIMessage(content="", tool_calls=calls, usage_metadata=self._usage(messages, 60))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.llm_latency)
+        message = self._tool_turn(messages)
+        if message is None:
+            time.sleep(self.report_tokens / self.token_rate)
+            message = AIMessage(content="".join(_words(self.report_tokens)),
+                                usage_metadata=self._usage(messages, self.report_tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.llm_latency)
+        message = self._tool_turn(messages)
+        if message is None:
+            await asyncio.sleep(self.report_tokens / self.token_rate)
+            message = AIMessage(content="".join(_words(self.report_tokens)),
+                                usage_metadata=self._usage(messages, self.report_tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.llm_latency)
+        message = self._tool_turn(messages)
+        if message is not None:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=[
+                    {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                    for i, c in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata
+            ))
+            return
+        words = _words(self.report_tokens)
+        for i, word in enumerate(words):
+            await asyncio.sleep(1 / self.token_rate)
+            chunk = AIMessageChunk(content=word)
+            if i == len(words) - 1:
+                chunk.usage_metadata = self._usage(messages, self.report_tokens)
+            if run_manager:
+                await run_manager.on_llm_new_token(word, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+
+class StubTicker:
+    """Stands in for yfinance.Ticker with deterministic synthetic data"""
+
+    latency = DEFAULT_STUBS["yahoo_latency"]
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self._seed = sum(ord(c) for c in ticker)
+
+    def _wait(self):
+        time.sleep(self.latency)
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        self._wait()
+        price = 20.0 + self._seed % 180
+        return {"symbol": self.ticker, "shortName": f"{self.ticker} Corp", "industry": "Industrials",
+                "sector": "Industrials", "currentPrice": price, "previousClose": price * 0.99,
+                "marketCap": int(price * 1e9), "trailingPE": 15.0, "forwardPE": 13.0, "recommendationMean": 2.1}
+
+    def history(self, start=None, end=None, **kwargs) -> pd.DataFrame:
+        self._wait()
+        return synthetic_history(self._seed, start, end)
+
+    def _statement(self, items: Dict[str, float]) -> pd.DataFrame:
+        self._wait()
+        years = pd.to_datetime(["2024-12-31", "2023-12-31", "2022-12-31"])
+        scale = 1e8 * (1 + self._seed % 50)
+        return pd.DataFrame({year: {k: v * scale * (1 - 0.05 * i) for k, v in items.items()}
+                             for i, year in enumerate(years)})
+
+    @property
+    def financials(self) -> pd.DataFrame:
+        return self._statement({"Total Revenue": 10.0, "Net Income": 0.8, "Gross Profit": 3.5})
+
+    @property
+    def balance_sheet(self) -> pd.DataFrame:
+        return self._statement({"Total Assets": 20.0, "Total Liabilities Net Minority Interest": 12.0,
+                                "Common Stock Equity": 8.0})
+
+    @property
+    def cashflow(self) -> pd.DataFrame:
+        return self._statement({"Operating Cash Flow": 1.5, "Free Cash Flow": 0.9})
+
+
+def synthetic_history(seed: int, start=None, end=None) -> pd.DataFrame:
+    end = pd.Timestamp(end or pd.Timestamp.now()).normalize()
+    start = pd.Timestamp(start or end - pd.Timedelta(days=365)).normalize()
+    dates = pd.bdate_range(start, end)
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    volume = rng.integers(1_000_000, 5_000_000, len(dates))
+    return pd.DataFrame({"Close": close, "Volume": volume}, index=pd.DatetimeIndex(dates, name="Date"))
+
+
+def stub_download(tickers, start=None, end=None, **kwargs) -> pd.DataFrame:
+    """Stands in for yfinance.download(group_by="ticker")"""
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    time.sleep(StubTicker.latency)
+    frames = {t: synthetic_history(sum(ord(c) for c in t), start, end) for t in tickers}
+    return pd.concat(frames, axis=1)
+
+
+def install_stubs(settings: Optional[Dict[str, Any]] = None):
+    """
+    Swap the Anthropic model and yfinance for local stand-ins in this process
+
+    Args:
+        settings: Overrides for DEFAULT_STUBS
+    """
+    settings = {**DEFAULT_STUBS, **(settings or {})}
+    import yfinance
+    from app.agents import research_agent
+
+    StubTicker.latency = settings["yahoo_latency"]
+    yfinance.Ticker = StubTicker
+    yfinance.download = stub_download
+
+    def fake_anthropic(**kwargs):
+        return FakeAnthropic(
+            llm_latency=settings["llm_latency"], token_rate=settings["token_rate"],
+            report_tokens=settings["report_tokens"], **kwargs
+        )
+    research_agent.ChatAnthropic = fake_anthropic
@@ -0,0 +1,22 @@
+# benchmarks/worker.py
+"""Celery worker with local stand-ins installed, spawned by benchmarks.run"""
+from benchmarks.stubs import load_settings, apply_overrides, install_stubs
+
+
+def main():
+    settings = load_settings()
+    apply_overrides(settings.get("config", {}))
+    install_stubs(settings.get("stubs"))
+
+    from config.celery_config import celery_app, GENERATION_QUEUE, RENDER_QUEUE, PREFETCH_QUEUE
+    # One process serves every queue here; production runs a pool per queue
+    celery_app.worker_main([
+        "worker", "--pool", "threads",
+        "--queues", ",".join([GENERATION_QUEUE, RENDER_QUEUE, PREFETCH_QUEUE]),
+        "--concurrency", str(settings.get("worker_concurrency", 32)),
+        "--loglevel", "warning", "--without-gossip", "--without-mingle",
+    ])
+
+
+if __name__ == "__main__":
+    main()
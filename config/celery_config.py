@@ -3,6 +3,16 @@
 from celery import Celery
 from .config_load import CONFIG
 
+CELERY_CONFIG = CONFIG.get("celery", {})
+# Each kind of work has its own queue, consumed by its own worker pool
+GENERATION_QUEUE = CELERY_CONFIG.get("generation_queue", "reports")
+RENDER_QUEUE = CELERY_CONFIG.get("render_queue", "render")
+PREFETCH_QUEUE = CELERY_CONFIG.get("prefetch_queue", "prefetch")
+# Redis emulates priorities with one list per level: "reports", "reports:1" ... "reports:9".
+# Workers drain lower numbers first; 0 is the highest priority.
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ":"
+
 celery_app = Celery(
     "tasks",
     broker=CONFIG["redis"]["url"],
@@ -15,5 +25,19 @@ celery_app.conf.update(
     result_serializer="json",
     accept_content=["json"],
     result_expires=3600 * 2,  # 2 hours cleanup
-    task_acks_late=True
-)
\ No newline at end of file
+    task_acks_late=True,
+    task_routes={
+        "app.tasks.generate_report_task": {"queue": GENERATION_QUEUE},
+        "app.tasks.render_report_artifacts_task": {"queue": RENDER_QUEUE},
+        "app.tasks.prefetch_market_data_task": {"queue": PREFETCH_QUEUE},
+    },
+    task_default_priority=0,
+    broker_transport_options={
+        "priority_steps": PRIORITY_STEPS,
+        "sep": PRIORITY_SEP,
+        "queue_order_strategy": "priority",
+    },
+    # Reserve one task per worker thread, so high-priority work that arrives
+    # later isn't stuck behind a long local backlog
+    worker_prefetch_multiplier=1
+)
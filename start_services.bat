@@ -1,4 +1,6 @@
 @echo off
 start cmd /k "conda activate equity && uvicorn app.main:app --reload"
-start cmd /k "conda activate equity && celery -A config.celery_config.celery_app worker --loglevel=info"
+start cmd /k "conda activate equity && celery -A config.celery_config.celery_app worker -Q reports -n reports@%%h --pool threads --concurrency 32 --loglevel=info"
+start cmd /k "conda activate equity && celery -A config.celery_config.celery_app worker -Q render -n render@%%h --pool solo --loglevel=info"
+start cmd /k "conda activate equity && celery -A config.celery_config.celery_app worker -Q prefetch -n prefetch@%%h --pool threads --concurrency 4 --loglevel=info"
 echo All services launched!
\ No newline at end of file
@@ -10,10 +10,18 @@ sleep 1
 osascript -e "tell application \"Terminal\" to do script \"cd $(pwd) && conda activate ${CONDA_ENV} && uvicorn app.main:app --reload\" in selected tab of the front window"
 echo "FastAPI application started..."
 
-# Launch Celery Worker in another new Terminal tab
-osascript -e 'tell application "Terminal" to activate' -e 'tell application "System Events" to tell process "Terminal" to keystroke "t" using command down'
-sleep 1
-osascript -e "tell application \"Terminal\" to do script \"cd $(pwd) && conda activate ${CONDA_ENV} && celery -A config.celery_config.celery_app worker --loglevel=info\" in selected tab of the front window"
-echo "Celery Worker started..."
+# Launch one Celery worker pool per queue, each in a new Terminal tab:
+# report generation (I/O bound threads), PDF rendering (processes) and market data prefetch
+CELERY_WORKERS=(
+    "-Q reports -n reports@%h --pool threads --concurrency 32"
+    "-Q render -n render@%h --pool prefork --concurrency 2"
+    "-Q prefetch -n prefetch@%h --pool threads --concurrency 4"
+)
+for WORKER_ARGS in "${CELERY_WORKERS[@]}"; do
+    osascript -e 'tell application "Terminal" to activate' -e 'tell application "System Events" to tell process "Terminal" to keystroke "t" using command down'
+    sleep 1
+    osascript -e "tell application \"Terminal\" to do script \"cd $(pwd) && conda activate ${CONDA_ENV} && celery -A config.celery_config.celery_app worker ${WORKER_ARGS} --loglevel=info\" in selected tab of the front window"
+done
+echo "Celery Workers started..."
 
 echo "All services launched!"
\ No newline at end of file